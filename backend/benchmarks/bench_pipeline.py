@@ -0,0 +1,313 @@
+"""
+End-to-end throughput of process_audio_presentation against local stand-ins
+for Gemini, Pollinations, Plus AI and the WhatsApp Graph API.
+
+Runs N jobs, C at a time, through the real pipeline in one process (Celery in
+eager mode, so the process plays one worker with C slots) and reports per-stage
+p50/p95/p99 latency, decks per minute and peak RSS. Results are written as JSON
+to benchmarks/results/ (git-ignored, or --output) so runs can be compared across
+commits. Run from backend/:
+
+    python -m benchmarks.bench_pipeline --jobs 40 --concurrency 8
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<earlier>.json
+
+Limits in Config (GEMINI_MODEL_RPM, GEMINI_RATE_LIMIT_COOLDOWN, GRAPH_RETRY_BACKOFF,
+...) apply as configured; override them through the environment.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from benchmarks.bench_pptx import sample_deck
+from benchmarks.fakes import FakeGenAI, FakeUpstream, Latency, install_http
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+WHATSAPP_TO = "15550000000"
+
+class StageTimer:
+    """Collects wall-clock durations per stage from any thread."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage: str, fn, after=None):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+            if after is not None:
+                after(result)
+            return result
+        return timed
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def _peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux
+    return {
+        "process": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+def _configure(args, workdir: str):
+    """Points every path at workdir and turns off what the stand-in audio cannot go through."""
+    Config.OUTPUT_DIR = os.path.join(workdir, "output")
+    Config.UPLOAD_DIR = os.path.join(workdir, "uploads")
+    Config.ARTIFACT_DIR = os.path.join(Config.OUTPUT_DIR, "store")
+    Config.IMAGE_CACHE_DIR = os.path.join(workdir, "images")
+    for directory in (Config.OUTPUT_DIR, Config.UPLOAD_DIR, Config.IMAGE_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+    if not args.use_redis:
+        Config.REDIS_URL = "" # Keep router state, caches and counters out of a shared Redis
+    # The stand-in audio is random bytes, not something ffmpeg can decode
+    Config.AUDIO_PREPROCESS_ENABLED = False
+    Config.AUDIO_CHUNK_THRESHOLD = 0
+    Config.WHATSAPP_API_TOKEN = "bench-token"
+    Config.WHATSAPP_PHONE_NUMBER_ID = "100000000000000"
+    Config.PLUSAI_API_KEY = "bench-key" if args.plus else None
+
+def _deck_for(slides: int):
+    def deck(serial: int) -> dict:
+        data = sample_deck(serial, slides)
+        data["interpretation"] = "Benchmark deck."
+        for n, slide in enumerate(data["slides"]):
+            # Distinct per job, so images miss the cache as they would in production
+            slide["image_query"] = f"bench {serial} slide {n}"
+        return data
+    return deck
+
+def _pdf_available() -> bool:
+    from services.pdf_service import HAS_UNO
+    return HAS_UNO or shutil.which(Config.LIBREOFFICE_BIN) is not None
+
+def _install(args, timer: StageTimer, upstream: FakeUpstream, genai: FakeGenAI) -> dict:
+    """Swaps in the fakes and the stage timers. Returns notes for the results file."""
+    import tasks
+    from services import gemini_service, pptx_service
+    from services.plus_service import PlusAIService
+
+    notes = {}
+    tasks.celery_app.conf.update(
+        task_always_eager=True,
+        task_store_eager_result=True,
+        result_backend="cache+memory://",
+    )
+    tasks.celery_app.finalize(auto=True) # Bind the tasks here, not racily in the job threads
+    install_http(upstream)
+    gemini_service.genai = genai
+    gemini_service._models.clear() # Handles built on the real SDK
+    gemini_service.HAS_GEMINI = True
+
+    if not _pdf_available() or args.fake_pdf:
+        # LibreOffice is local, not an external API, but it is not always installed
+        pdf_latency = Latency(args.pdf_seconds)
+
+        def convert_to_pdf(pptx_path, output_dir=None):
+            time.sleep(pdf_latency.sample())
+            stem = os.path.splitext(os.path.basename(pptx_path))[0]
+            pdf_path = os.path.join(output_dir or os.path.dirname(pptx_path), stem + ".pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(b"%PDF-1.4\n%bench\n")
+            return pdf_path
+
+        def convert_bytes_to_pdf(pptx_bytes):
+            time.sleep(pdf_latency.sample())
+            return b"%PDF-1.4\n%bench\n"
+
+        tasks.convert_to_pdf, tasks.convert_bytes_to_pdf = convert_to_pdf, convert_bytes_to_pdf
+        notes["pdf"] = f"stand-in ({args.pdf_seconds}s)"
+    else:
+        notes["pdf"] = "libreoffice"
+
+    tasks.analyze_audio = timer.wrap("analyze", tasks.analyze_audio)
+    tasks.generate_pptx = timer.wrap("render", tasks.generate_pptx)
+    tasks.render_pptx_bytes = timer.wrap("render", tasks.render_pptx_bytes)
+    tasks.convert_to_pdf = timer.wrap("convert", tasks.convert_to_pdf)
+    tasks.convert_bytes_to_pdf = timer.wrap("convert", tasks.convert_bytes_to_pdf)
+    tasks.send_whatsapp_documents = timer.wrap("deliver", tasks.send_whatsapp_documents)
+    pptx_service.download_image = timer.wrap("image", pptx_service.download_image)
+
+    def countdown(pptx_url):
+        # Eager retries run at once; wait out the countdown a worker would get
+        if not pptx_url:
+            time.sleep(Config.PLUSAI_POLL_INTERVAL)
+
+    for stage, name, after in (
+        ("plus_submit", "submit_presentation", None),
+        ("plus_poll", "check_presentation", countdown),
+        ("plus_download", "download_presentation", None),
+    ):
+        setattr(PlusAIService, name, staticmethod(timer.wrap(stage, getattr(PlusAIService, name), after)))
+    return notes
+
+def _run_job(index: int, audio_bytes: int, timer: StageTimer) -> bool:
+    import tasks
+    from services.artifact_store import get_artifact_store, KIND_UPLOAD
+
+    meta = get_artifact_store().put_bytes(os.urandom(audio_bytes), f"bench_{index}.ogg", KIND_UPLOAD)
+    started = time.perf_counter()
+    result = tasks.process_audio_presentation.apply(
+        args=(meta["name"],), kwargs={"whatsapp_to": WHATSAPP_TO, "audio_sha256": meta["digest"]}
+    ).get(propagate=False)
+    timer.record("job", time.perf_counter() - started)
+    return isinstance(result, dict) and result.get("status") == "success"
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench-pipeline-")
+    _configure(args, workdir)
+
+    from services.pptx_service import render_pptx_bytes
+    timer = StageTimer()
+    http_latency = Latency(args.http_latency, error_rate=args.http_error_rate, seed=args.seed)
+    upstream = FakeUpstream(
+        http_latency,
+        plus_generation_seconds=args.plus_generation,
+        pptx_bytes=render_pptx_bytes(sample_deck(0, args.slides)),
+    ).start()
+    genai = FakeGenAI(
+        upload=Latency(args.upload_latency, error_rate=args.gemini_error_rate, seed=args.seed),
+        generate=Latency(args.gemini_latency, error_rate=args.gemini_error_rate, seed=args.seed),
+        deck_for=_deck_for(args.slides),
+    )
+    notes = _install(args, timer, upstream, genai)
+
+    # Service code reports progress with print(); keep it out of the report
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("tasks").setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    try:
+        with quiet, ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="job") as pool:
+            outcomes = list(pool.map(lambda i: _run_job(i, args.audio_bytes, timer), range(args.jobs)))
+    finally:
+        upstream.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    wall = time.perf_counter() - started
+
+    from utils.counters import get_counters
+    succeeded = sum(outcomes)
+    return {
+        "benchmark": "pipeline",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "params": vars(args),
+        "mode": "plus" if args.plus else ("in_memory" if Config.PPTX_IN_MEMORY else "staged"),
+        "notes": notes,
+        "jobs": {
+            "total": args.jobs,
+            "succeeded": succeeded,
+            "failed": args.jobs - succeeded,
+            "wall_seconds": wall,
+            "decks_per_minute_per_worker": succeeded / wall * 60,
+        },
+        "stages": {stage: summarize(values) for stage, values in sorted(timer.samples.items())},
+        "upstream": {"calls": dict(upstream.calls), "injected_errors": dict(upstream.errors)},
+        "gemini": {
+            "calls": dict(genai.calls),
+            "injected_errors": dict(genai.errors),
+            "counters": get_counters("gemini."),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def report(results: dict, baseline: dict = None):
+    jobs = results["jobs"]
+    print(
+        f"{jobs['succeeded']}/{jobs['total']} decks in {jobs['wall_seconds']:.1f}s "
+        f"({results['mode']}, concurrency {results['params']['concurrency']}): "
+        f"{jobs['decks_per_minute_per_worker']:.1f} decks/min per worker, "
+        f"peak RSS {results['peak_rss_mb']['process']:.0f} MB"
+    )
+    print(f"{'stage':<14} {'n':>5} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for stage, s in results["stages"].items():
+        line = f"{stage:<14} {s['count']:>5} {s['p50']:>8.3f} {s['p95']:>8.3f} {s['p99']:>8.3f} {s['max']:>8.3f}"
+        before = (baseline or {}).get("stages", {}).get(stage)
+        if before:
+            line += f"   p50 {s['p50'] / before['p50'] - 1:+.0%}, p95 {s['p95'] / before['p95'] - 1:+.0%}"
+        print(line)
+    if baseline:
+        before = baseline["jobs"]["decks_per_minute_per_worker"]
+        change = jobs["decks_per_minute_per_worker"] / before - 1 if before else 0.0
+        print(f"throughput vs {baseline.get('git_commit') or 'baseline'}: {change:+.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--slides", type=int, default=8)
+    parser.add_argument("--audio-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--gemini-latency", type=float, default=4.0, help="Mean seconds per generate call")
+    parser.add_argument("--upload-latency", type=float, default=0.5, help="Mean seconds per Files API upload")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="Fraction of Gemini calls that 429")
+    parser.add_argument("--http-latency", type=float, default=0.2, help="Mean seconds per HTTP request")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Fraction of HTTP requests that 429/503")
+    parser.add_argument("--plus", action="store_true", help="Generate decks through (fake) Plus AI")
+    parser.add_argument("--plus-generation", type=float, default=10.0, help="Seconds until a Plus AI deck is ready")
+    parser.add_argument("--pdf-seconds", type=float, default=1.5, help="Stand-in conversion time without LibreOffice")
+    parser.add_argument("--fake-pdf", action="store_true", help="Use the PDF stand-in even if LibreOffice is installed")
+    parser.add_argument("--use-redis", action="store_true", help="Use the configured Redis instead of local state")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=RESULTS_DIR, help="Directory for the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = run(args)
+    os.makedirs(args.output, exist_ok=True)
+    name = f"pipeline_{time.strftime('%Y%m%d-%H%M%S')}_{results['git_commit'] or 'nogit'}.json"
+    path = os.path.join(args.output, name)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    report(results, baseline)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
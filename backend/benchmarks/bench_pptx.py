@@ -0,0 +1,174 @@
+"""
+Per-deck CPU time and output size of the PPTX renderer, before and after the
+template-cached rewrite.
+
+Images are left out so only rendering is measured. Run from backend/:
+
+    python -m benchmarks.bench_pptx --decks 50 --slides 10
+"""
+import argparse
+import statistics
+import time
+from io import BytesIO
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.dml.color import RGBColor
+from services.pptx_service import build_presentation, hex_to_rgb
+
+PALETTES = [
+    {"background_color": "#1E1E2E", "text_color": "#E0E0E0", "accent_color": "#F5A623"},
+    {"background_color": "#FFFFFF", "text_color": "#222222", "accent_color": "#0057B8"},
+    {"background_color": "#0B3D2E", "text_color": "#F0F0F0", "accent_color": "#7FD1AE"},
+]
+
+def legacy_build_presentation(data: dict) -> Presentation:
+    """Frozen copy of the previous generate_pptx (without images), kept as the baseline."""
+    prs = Presentation()
+
+
+    # Extract Visual Style
+    style = data.get("visual_style", {})
+    bg_color_hex = style.get("background_color", "#FFFFFF")
+    text_color_hex = style.get("text_color", "#000000")
+    accent_color_hex = style.get("accent_color", "#0000FF")
+
+    bg_rgb = hex_to_rgb(bg_color_hex)
+    text_rgb = hex_to_rgb(text_color_hex)
+    accent_rgb = hex_to_rgb(accent_color_hex)
+
+    # --- Title Slide ---
+    title_slide_layout = prs.slide_layouts[0]
+    slide = prs.slides.add_slide(title_slide_layout)
+
+    # Apply Background
+    background = slide.background
+    fill = background.fill
+    fill.solid()
+    fill.fore_color.rgb = RGBColor(*bg_rgb)
+
+    title = slide.shapes.title
+    subtitle = slide.placeholders[1]
+
+    title.text = data.get("title", "Generated Presentation")
+    # Apply accent color to title
+    if title.text_frame:
+        for p in title.text_frame.paragraphs:
+            p.font.color.rgb = RGBColor(*accent_rgb)
+
+    subtitle.text = "Generated by AI Voice-to-Presentation"
+    # Apply text color to subtitle
+    if subtitle.text_frame:
+        for p in subtitle.text_frame.paragraphs:
+            p.font.color.rgb = RGBColor(*text_rgb)
+
+    slides = data.get("slides", [])
+
+    # --- Content Slides ---
+    # Using Blank layout (6) to custom position everything for better design control
+    blank_slide_layout = prs.slide_layouts[6]
+
+    for slide_data in slides:
+        slide = prs.slides.add_slide(blank_slide_layout)
+
+        # Apply Background
+        background = slide.background
+        fill = background.fill
+        fill.solid()
+        fill.fore_color.rgb = RGBColor(*bg_rgb)
+
+        # 1. Title (Top, Full Width)
+        # Left, Top, Width, Height
+        title_shape = slide.shapes.add_textbox(Inches(0.5), Inches(0.4), Inches(9), Inches(1))
+        title_tf = title_shape.text_frame
+        title_tf.text = slide_data.get("title", "Untitled Slide")
+        title_p = title_tf.paragraphs[0]
+        title_p.font.size = Pt(36)
+        title_p.font.bold = True
+        title_p.font.color.rgb = RGBColor(*accent_rgb)
+
+        body_shape = slide.shapes.add_textbox(Inches(0.5), Inches(1.8), Inches(9), Inches(5))
+
+        tf = body_shape.text_frame
+        tf.word_wrap = True
+
+        bullet_points = slide_data.get("bullet_points", [])
+        if bullet_points:
+            # First point (needed because text_frame starts with one empty paragraph)
+            p = tf.paragraphs[0]
+            p.text = bullet_points[0]
+            p.font.size = Pt(20)
+            p.font.color.rgb = RGBColor(*text_rgb)
+            p.space_after = Pt(14)
+            # Use a dash as bullet visually since we are using textbox
+            if not p.text.startswith("-") and not p.text.startswith("•"):
+                p.text = "• " + p.text
+
+            # Other points
+            for point in bullet_points[1:]:
+                p = tf.add_paragraph()
+                p.text = "• " + point
+                p.font.size = Pt(20)
+                p.font.color.rgb = RGBColor(*text_rgb)
+                p.space_after = Pt(14)
+
+        # Add speaker notes
+        notes_slide = slide.notes_slide
+        text_frame = notes_slide.notes_text_frame
+        text_frame.text = slide_data.get("speaker_notes", "")
+    return prs
+
+def sample_deck(index: int, slides: int) -> dict:
+    return {
+        "title": f"Quarterly review {index}",
+        "visual_style": PALETTES[index % len(PALETTES)],
+        "slides": [
+            {
+                "title": f"Topic {n}",
+                "bullet_points": [f"Point {n}.{k}: revenue, churn and hiring outlook" for k in range(5)],
+                "speaker_notes": f"Talk through topic {n} in about a minute.",
+            }
+            for n in range(slides)
+        ],
+    }
+
+def measure(build, decks: list) -> dict:
+    cpu_times, sizes = [], []
+    for data in decks:
+        started = time.process_time()
+        buffer = BytesIO()
+        build(data).save(buffer)
+        cpu_times.append(time.process_time() - started)
+        sizes.append(buffer.tell())
+    return {
+        "cpu_ms_mean": statistics.mean(cpu_times) * 1000,
+        "cpu_ms_median": statistics.median(cpu_times) * 1000,
+        "bytes_mean": statistics.mean(sizes),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decks", type=int, default=30)
+    parser.add_argument("--slides", type=int, default=10)
+    args = parser.parse_args()
+
+    decks = [sample_deck(i, args.slides) for i in range(args.decks)]
+    # Warm up both paths (imports, template cache) before measuring
+    for build in (legacy_build_presentation, build_presentation):
+        build(decks[0]).save(BytesIO())
+
+    results = {
+        "legacy": measure(legacy_build_presentation, decks),
+        "template": measure(build_presentation, decks),
+    }
+    print(f"{args.decks} decks x {args.slides} slides")
+    print(f"{'renderer':<10} {'cpu ms/deck (mean)':>20} {'cpu ms/deck (p50)':>18} {'bytes/deck':>12}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['cpu_ms_mean']:>20.1f} {r['cpu_ms_median']:>18.1f} {r['bytes_mean']:>12.0f}")
+    before, after = results["legacy"], results["template"]
+    print(
+        f"CPU time {after['cpu_ms_mean'] / before['cpu_ms_mean']:.2f}x, "
+        f"size {after['bytes_mean'] / before['bytes_mean']:.2f}x of legacy"
+    )
+
+if __name__ == "__main__":
+    main()
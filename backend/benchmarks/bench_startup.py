@@ -0,0 +1,88 @@
+"""
+Cold-start time of the API (main) and worker (tasks) modules.
+
+Each run imports the module in a fresh interpreter and records the interpreter's
+total wall time, the import alone, peak RSS and which heavy libraries got loaded.
+Results are written as JSON next to the pipeline results. Run from backend/:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.bench_pipeline import RESULTS_DIR, git_commit
+
+MODULES = {"api": "main", "worker": "tasks"}
+
+# Libraries the API process should not need to load
+HEAVY_MODULES = ("google.generativeai", "pptx", "lxml", "PIL", "uno", "boto3")
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+import_seconds = time.perf_counter() - started
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+def measure(module: str, runs: int) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    totals, imports, rss = [], [], []
+    heavy = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, timeout=120, env=os.environ.copy()
+        )
+        totals.append(time.perf_counter() - started)
+        if process.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+        probe = json.loads(process.stdout.strip().splitlines()[-1])
+        imports.append(probe["import_seconds"])
+        rss.append(probe["peak_rss_mb"])
+        heavy = probe["heavy_modules"]
+    return {
+        "module": module,
+        "runs": runs,
+        "process_seconds_median": statistics.median(totals),
+        "import_seconds_median": statistics.median(imports),
+        "import_seconds_max": max(imports),
+        "peak_rss_mb": max(rss),
+        "heavy_modules": heavy,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=RESULTS_DIR, help="Directory for the JSON results")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "startup",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "components": {component: measure(module, args.runs) for component, module in MODULES.items()},
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"startup_{time.strftime('%Y%m%d-%H%M%S')}_{results['git_commit'] or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'component':<10} {'process s':>10} {'import s':>10} {'RSS MB':>8}  heavy modules")
+    for component, r in results["components"].items():
+        print(
+            f"{component:<10} {r['process_seconds_median']:>10.2f} {r['import_seconds_median']:>10.2f} "
+            f"{r['peak_rss_mb']:>8.0f}  {', '.join(r['heavy_modules']) or '-'}"
+        )
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
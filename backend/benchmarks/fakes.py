@@ -0,0 +1,266 @@
+"""
+Local stand-ins for the external services the pipeline calls, for benchmarks.
+
+FakeUpstream is one HTTP server that answers for Pollinations, Plus AI and the
+WhatsApp Graph API. install_http() points the shared HTTP client at it, so the
+real request/retry code runs unchanged. FakeGenAI replaces the Gemini SDK module.
+Both add configurable latency and inject 429s/errors at a given rate.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import SimpleNamespace
+import httpx
+from config import Config
+from utils import http_client
+
+POLLINATIONS_HOST = "image.pollinations.ai"
+PLUS_HOST = "api.plusdocs.com"
+GRAPH_HOST = "graph.facebook.com"
+MEDIA_HOST = "lookaside.fbsbx.com"
+
+class Latency:
+    """A latency distribution (mean seconds, +/- jitter fraction) plus an error rate."""
+
+    def __init__(self, mean: float, jitter: float = 0.25, error_rate: float = 0.0, seed: int = None):
+        self.mean = mean
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            return max(0.0, self.mean * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+def _png_bytes() -> bytes:
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("RGB", (64, 36), (40, 90, 160)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class FakeUpstream:
+    """
+    Threaded HTTP server emulating Pollinations, Plus AI and the Graph API.
+    Requests carry the host they were meant for in X-Upstream-Host.
+    """
+
+    def __init__(self, latency: Latency, plus_generation_seconds: float = 5.0, pptx_bytes: bytes = b""):
+        self.latency = latency
+        self.plus_generation_seconds = plus_generation_seconds
+        self.pptx_bytes = pptx_bytes
+        self.image_bytes = _png_bytes()
+        self.calls = Counter()
+        self.errors = Counter()
+        self._plus_ready_at = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, counter: Counter, endpoint: str):
+        with self._lock:
+            counter[endpoint] += 1
+
+    def _route(self, method: str, host: str, path: str):
+        """Returns (endpoint, status, content_type, body) for one request."""
+        path = path.split("?", 1)[0]
+        if host == POLLINATIONS_HOST and path.startswith("/prompt/"):
+            return "image", 200, "image/png", self.image_bytes
+
+        if host == PLUS_HOST:
+            if method == "POST" and path == "/r/v0/presentation":
+                job = uuid.uuid4().hex
+                with self._lock:
+                    self._plus_ready_at[job] = time.monotonic() + self.plus_generation_seconds
+                polling_url = f"https://{PLUS_HOST}/r/v0/presentation/{job}"
+                return "plus_submit", 202, "application/json", json.dumps({"pollingUrl": polling_url}).encode()
+            if method == "GET" and path.startswith("/r/v0/presentation/"):
+                job = path.rsplit("/", 1)[-1]
+                with self._lock:
+                    ready_at = self._plus_ready_at.get(job)
+                if ready_at is None:
+                    return "plus_poll", 404, "application/json", b"{}"
+                if time.monotonic() < ready_at:
+                    data = {"status": "PROCESSING"}
+                else:
+                    data = {"status": "GENERATED", "url": f"https://{PLUS_HOST}/files/{job}.pptx"}
+                return "plus_poll", 200, "application/json", json.dumps(data).encode()
+            if method == "GET" and path.startswith("/files/"):
+                return "plus_download", 200, "application/octet-stream", self.pptx_bytes
+
+        if host == GRAPH_HOST:
+            if method == "POST" and path.endswith("/messages"):
+                data = {"messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+                return "graph_messages", 200, "application/json", json.dumps(data).encode()
+            if method == "POST" and path.endswith("/media"):
+                return "graph_media_upload", 200, "application/json", json.dumps({"id": uuid.uuid4().hex}).encode()
+            if method == "GET":
+                media_id = path.rsplit("/", 1)[-1]
+                data = {"url": f"https://{MEDIA_HOST}/media/{media_id}"}
+                return "graph_media_info", 200, "application/json", json.dumps(data).encode()
+
+        if host == MEDIA_HOST and method == "GET":
+            return "graph_media_download", 200, "audio/ogg", b"OggS" + bytes(4096)
+
+        return "unknown", 404, "application/json", b'{"error": "unknown endpoint"}'
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real services
+
+            def _serve(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length) # Uploads are drained, not kept
+                host = self.headers.get("X-Upstream-Host", "")
+                endpoint, status, content_type, payload = upstream._route(method, host, self.path)
+                upstream._count(upstream.calls, endpoint)
+                time.sleep(upstream.latency.sample())
+                if endpoint != "unknown" and upstream.latency.should_fail():
+                    upstream._count(upstream.errors, endpoint)
+                    status, content_type = random.choice((429, 503)), "application/json"
+                    payload = b'{"error": {"message": "injected failure"}}'
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+class RedirectTransport(httpx.HTTPTransport):
+    """Sends every request to the fake upstream, keeping the original host in a header."""
+
+    def __init__(self, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.port = port
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers["X-Upstream-Host"] = request.url.host
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return super().handle_request(request)
+
+def install_http(upstream: FakeUpstream):
+    """Replaces this process's shared HTTP client with one that talks to upstream."""
+    limits = httpx.Limits(
+        max_connections=Config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.HTTP_MAX_CONNECTIONS,
+    )
+    with http_client._lock:
+        http_client._client = httpx.Client(
+            transport=RedirectTransport(upstream.port, limits=limits),
+            timeout=httpx.Timeout(Config.HTTP_TIMEOUT),
+            follow_redirects=True,
+        )
+        http_client._client_pid = os.getpid()
+
+class FakeGenAI:
+    """
+    Drop-in for the google.generativeai module as gemini_service uses it. Each
+    generate call sleeps for the generation latency and returns deck_for(n)
+    (n counts calls), streamed in pieces when stream=True.
+    """
+
+    def __init__(self, upload: Latency, generate: Latency, deck_for, stream_chunks: int = 12):
+        self.upload = upload
+        self.generate = generate
+        self.deck_for = deck_for
+        self.stream_chunks = stream_chunks
+        self.calls = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._serial = 0
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name, generation_config=None):
+                self.model_name = model_name
+
+            async def generate_content_async(self, contents, stream=False):
+                return await fake._generate(self.model_name, contents, stream)
+
+        self.GenerativeModel = GenerativeModel
+
+    def _count(self, counter: Counter, endpoint: str):
+        with self._lock:
+            counter[endpoint] += 1
+
+    def _maybe_fail(self, latency: Latency, endpoint: str):
+        if latency.should_fail():
+            self._count(self.errors, endpoint)
+            raise Exception("429 Resource has been exhausted (e.g. check quota). [injected]")
+
+    def upload_file(self, path):
+        self._count(self.calls, "upload_file")
+        time.sleep(self.upload.sample())
+        self._maybe_fail(self.upload, "upload_file")
+        return SimpleNamespace(name=f"files/{uuid.uuid4().hex}", state=SimpleNamespace(name="ACTIVE"))
+
+    def get_file(self, name):
+        return SimpleNamespace(name=name, state=SimpleNamespace(name="ACTIVE"))
+
+    def delete_file(self, name):
+        self._count(self.calls, "delete_file")
+
+    def list_models(self):
+        return [SimpleNamespace(name="models/gemini-2.5-flash", supported_generation_methods=["generateContent"])]
+
+    async def _generate(self, model_name: str, contents, stream: bool):
+        self._count(self.calls, "generate_content")
+        with self._lock:
+            self._serial += 1
+            serial = self._serial
+        duration = self.generate.sample()
+        self._maybe_fail(self.generate, "generate_content")
+        text = json.dumps(self.deck_for(serial))
+        if not stream:
+            await asyncio.sleep(duration)
+            return SimpleNamespace(text=text)
+
+        step = max(1, len(text) // self.stream_chunks)
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+
+        async def chunks():
+            for piece in pieces:
+                await asyncio.sleep(duration / len(pieces))
+                yield SimpleNamespace(text=piece)
+
+        return chunks()
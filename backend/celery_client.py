@@ -0,0 +1,79 @@
+import time
+import uuid
+from celery import Celery
+from config import Config
+from utils.counters import incr
+from utils.inflight import claim, release
+
+# The Celery app shared by the API and the workers. It only knows task names,
+# so the API can enqueue work without importing tasks.py (Gemini, python-pptx,
+# LibreOffice...); the worker registers the task bodies on it in tasks.py.
+celery_app = Celery("worker", broker=Config.REDIS_URL, backend=Config.REDIS_URL)
+
+# Each pipeline stage has its own queue so CPU-bound conversion can be scaled
+# separately from I/O-bound API waits (see docker-compose.yml).
+celery_app.conf.task_routes = {
+    "process_audio_presentation": {"queue": "analyze"},
+    "render_presentation": {"queue": "render"},
+    "build_presentation_in_memory": {"queue": "render"},
+    "poll_plus_presentation": {"queue": "render"},
+    "convert_presentation": {"queue": "convert"},
+    "deliver_presentation": {"queue": "deliver"},
+    "ingest_whatsapp_audio": {"queue": "deliver"},
+    "send_whatsapp_text": {"queue": "deliver"},
+}
+
+# Recycle prefork children before leaks (lxml trees, PIL buffers) add up; the
+# threads pool of the analyze worker ignores both settings
+celery_app.conf.worker_max_tasks_per_child = Config.WORKER_MAX_TASKS_PER_CHILD or None
+celery_app.conf.worker_max_memory_per_child = Config.WORKER_MAX_MEMORY_PER_CHILD_MB * 1024 or None # KiB
+
+# Task names the API sends
+PROCESS_AUDIO = "process_audio_presentation"
+INGEST_WHATSAPP_AUDIO = "ingest_whatsapp_audio"
+SEND_WHATSAPP_TEXT = "send_whatsapp_text"
+
+def send_task(name: str, *args, **kwargs):
+    """Enqueues a task by name (routed like task.delay()). Returns its AsyncResult."""
+    return celery_app.send_task(name, args=args, kwargs=kwargs)
+
+def _attachable(result, claimed_at: float, reuse_result: bool) -> bool:
+    """Whether a repeat submission should get this existing job instead of a new one."""
+    if result.state in ("FAILURE", "REVOKED"):
+        return False
+    if result.state == "PENDING":
+        # Running jobs report PROGRESS, so PENDING is a queued job, or one whose
+        # message was lost (worker crash, broker flush) and will never run
+        return time.time() - claimed_at < Config.JOB_PENDING_GRACE
+    if result.state != "SUCCESS":
+        return True # Running
+    value = result.result
+    # Pipeline errors are returned as {"status": "error", ...}, not raised
+    if isinstance(value, dict) and value.get("status") == "error":
+        return False
+    return reuse_result
+
+def submit_once(key: str, name: str, *args, reuse_result: bool = True, **kwargs):
+    """
+    Enqueues a task by name unless a job registered under key is still running
+    (or, with reuse_result, finished successfully); failed jobs, and jobs still
+    PENDING after JOB_PENDING_GRACE, are replaced.
+    Returns (AsyncResult, attached), attached being True for an existing job.
+    """
+    task_id = str(uuid.uuid4())
+    stale = None
+    for _ in range(3):
+        holder, claimed_at = claim(key, task_id, Config.JOB_IDEMPOTENCY_TTL, stale)
+        if holder == task_id:
+            try:
+                return celery_app.send_task(name, args=args, kwargs=kwargs, task_id=task_id), False
+            except Exception:
+                release(key, task_id)
+                raise
+        existing = celery_app.AsyncResult(holder)
+        if _attachable(existing, claimed_at, reuse_result):
+            incr("jobs.coalesced")
+            return existing, True
+        stale = holder
+    # Other submissions keep replacing the job; follow the latest one
+    return celery_app.AsyncResult(holder), True
@@ -9,10 +9,107 @@ class Config:
     WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "my_secure_verify_token")
     WHATSAPP_API_TOKEN = os.getenv("WHATSAPP_API_TOKEN")
     WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+    WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET") # Optional: verifies X-Hub-Signature-256
+    WHATSAPP_DEDUPE_TTL = int(os.getenv("WHATSAPP_DEDUPE_TTL", str(24 * 3600)))
+    # Repeat submissions of the same audio (or Idempotency-Key) attach to the first job
+    # for this long; keep it within Celery's result_expires (1 day) so results still exist
+    JOB_IDEMPOTENCY_TTL = int(os.getenv("JOB_IDEMPOTENCY_TTL", str(24 * 3600)))
+    # A job still PENDING (never picked up) this long after it was claimed is
+    # treated as lost and replaced; keep it above the usual queue wait
+    JOB_PENDING_GRACE = int(os.getenv("JOB_PENDING_GRACE", "300"))
+    GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+    GRAPH_RETRY_BACKOFF = float(os.getenv("GRAPH_RETRY_BACKOFF", "1"))
     PLUSAI_API_KEY = os.getenv("PLUSAI_API_KEY") # New integration
+    PLUSAI_POLL_INTERVAL = float(os.getenv("PLUSAI_POLL_INTERVAL", "5"))
+    PLUSAI_POLL_MAX_INTERVAL = float(os.getenv("PLUSAI_POLL_MAX_INTERVAL", "20"))
+    PLUSAI_TIMEOUT = float(os.getenv("PLUSAI_TIMEOUT", "300"))
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
     OUTPUT_DIR = os.getenv("OUTPUT_DIR", "/app/outputs")
 
+    # Generated decks: opt in to building local decks in memory and finishing them in
+    # one render task (PDF conversion included, so the convert queue gets no work)
+    PPTX_IN_MEMORY = os.getenv("PPTX_IN_MEMORY", "false").lower() == "true"
+    ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(OUTPUT_DIR, "store"))
+
+    # Artifact store for uploads and outputs: "local" (ARTIFACT_DIR) or "s3" (S3/MinIO, needs boto3)
+    ARTIFACT_BACKEND = os.getenv("ARTIFACT_BACKEND", "local").lower()
+    ARTIFACT_S3_BUCKET = os.getenv("ARTIFACT_S3_BUCKET", "presentations")
+    ARTIFACT_S3_ENDPOINT = os.getenv("ARTIFACT_S3_ENDPOINT") # e.g. http://minio:9000
+    ARTIFACT_TTL = float(os.getenv("ARTIFACT_TTL", str(7 * 24 * 3600))) # Decks, PDFs, batch zips
+    UPLOAD_TTL = float(os.getenv("UPLOAD_TTL", str(24 * 3600))) # Uploaded audio
+    ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))
+    JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "3600")) # Seconds between cleanups; 0 disables
+
+    # Prometheus exporter port of each Celery worker (the API serves /metrics itself); 0 disables
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+    # Prefork worker children are replaced after this many tasks, or once they use
+    # more than this much memory (checked after each task); 0 disables either limit
+    WORKER_MAX_TASKS_PER_CHILD = int(os.getenv("WORKER_MAX_TASKS_PER_CHILD", "200"))
+    WORKER_MAX_MEMORY_PER_CHILD_MB = int(os.getenv("WORKER_MAX_MEMORY_PER_CHILD_MB", "1024"))
+
+    # Uploads
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(2 * 1024 * 1024))) # Suggested to chunked clients
+    MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
+    MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(1024 * 1024 * 1024))) # Whole /batches/ request
+
+    # Outbound HTTP (shared connection pool per process)
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+
+    # Slide images
+    IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "8"))
+    IMAGE_DECK_DEADLINE = float(os.getenv("IMAGE_DECK_DEADLINE", "30"))
+    IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "/app/cache/images")
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    IMAGE_CACHE_USE_REDIS = os.getenv("IMAGE_CACHE_USE_REDIS", "true").lower() == "true"
+
+    # Gemini analysis
+    GEMINI_FILE_POLL_MIN = float(os.getenv("GEMINI_FILE_POLL_MIN", "0.5"))
+    GEMINI_FILE_POLL_MAX = float(os.getenv("GEMINI_FILE_POLL_MAX", "5"))
+    GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    GEMINI_MODEL_RPM = int(os.getenv("GEMINI_MODEL_RPM", "10")) # Per model, shared by all workers
+    GEMINI_RATE_LIMIT_COOLDOWN = float(os.getenv("GEMINI_RATE_LIMIT_COOLDOWN", "60"))
+    GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "120")) # Longest wait for model capacity
+    GEMINI_LIST_MODELS_TTL = float(os.getenv("GEMINI_LIST_MODELS_TTL", "3600"))
+    GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() == "true" # JSON mode + response schema
+    GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "true").lower() == "true" # Start slide images while the deck streams in
+
+    # Audio pre-processing before the Gemini upload (ffmpeg)
+    AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "true").lower() == "true"
+    FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+    AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+    AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "24k")
+    AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+    AUDIO_TRIM_PAUSES = os.getenv("AUDIO_TRIM_PAUSES", "false").lower() == "true" # Also shorten long internal pauses
+    AUDIO_MAX_PAUSE = float(os.getenv("AUDIO_MAX_PAUSE", "1.0"))
+    AUDIO_PREPROCESS_TIMEOUT = float(os.getenv("AUDIO_PREPROCESS_TIMEOUT", "300"))
+    FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+    # Long recordings are analyzed as overlapping segments (map) and then combined (reduce)
+    AUDIO_CHUNK_THRESHOLD = float(os.getenv("AUDIO_CHUNK_THRESHOLD", "900")) # Seconds; 0 disables chunking
+    AUDIO_SEGMENT_SECONDS = float(os.getenv("AUDIO_SEGMENT_SECONDS", "480"))
+    AUDIO_SEGMENT_OVERLAP = float(os.getenv("AUDIO_SEGMENT_OVERLAP", "20"))
+    GEMINI_SEGMENT_RETRIES = int(os.getenv("GEMINI_SEGMENT_RETRIES", "2"))
+
+    # Gemini analysis cache (keyed on audio SHA-256 + prompt version + model)
+    ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+    ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "/app/cache/analysis")
+    ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+
+    # PDF conversion (one LibreOffice server per worker process)
+    LIBREOFFICE_BIN = os.getenv("LIBREOFFICE_BIN", "soffice")
+    LIBREOFFICE_PROFILE_ROOT = os.getenv("LIBREOFFICE_PROFILE_ROOT", "/tmp/lo-profiles")
+    LIBREOFFICE_STARTUP_TIMEOUT = float(os.getenv("LIBREOFFICE_STARTUP_TIMEOUT", "30"))
+    PDF_CONVERT_TIMEOUT = float(os.getenv("PDF_CONVERT_TIMEOUT", "120"))
+    PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "600")) # Max wait behind other conversions
+    # A server is restarted before its next job after this many conversions or
+    # past this much memory (soffice and its children); 0 disables either limit
+    LIBREOFFICE_MAX_JOBS = int(os.getenv("LIBREOFFICE_MAX_JOBS", "100"))
+    LIBREOFFICE_MAX_MEMORY_MB = int(os.getenv("LIBREOFFICE_MAX_MEMORY_MB", "1024"))
+
     @staticmethod
     def ensure_dirs():
         os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
@@ -1,21 +1,42 @@
 import os
 import sys
+import time
 import logging
 
 # Configure basic logging immediately to catch import errors
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_IMPORT_STARTED = time.perf_counter()
 try:
-    from fastapi import FastAPI, UploadFile, File, HTTPException, Request, BackgroundTasks
-    from fastapi.responses import JSONResponse, FileResponse
+    from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request, BackgroundTasks
+    from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
     from fastapi.middleware.cors import CORSMiddleware
     from config import Config
-    from tasks import process_audio_presentation
-    from utils.whatsapp import send_whatsapp_message, download_media
-    import shutil
-    import uuid
+    # Only the Celery client: the task bodies (Gemini, python-pptx, LibreOffice) load in the worker
+    from celery_client import (
+        celery_app, send_task, submit_once, PROCESS_AUDIO, INGEST_WHATSAPP_AUDIO, SEND_WHATSAPP_TEXT,
+    )
+    from utils.dedupe import first_seen, forget
+    from utils.progress import progress_hub
+    from utils.uploads import (
+        UploadTooLarge, UploadOffsetMismatch, save_upload_file, create_chunked_upload,
+        chunked_upload_offset, append_chunk, complete_chunked_upload, abort_chunked_upload,
+        prune_session_locks, extract_audio_zip, BodySizeLimitMiddleware, MULTIPART_OVERHEAD,
+    )
+    from services.batch_service import start_batch, batch_status, build_batch_zip
+    from services.artifact_store import get_artifact_store, run_janitor, KIND_UPLOAD
+    from utils.metrics import span, metrics_payload, STAGE_UPLOAD
+    from pydantic import BaseModel
+    from typing import List, Optional
+    import asyncio
+    import zipfile
     import json
+    import re
+    import hashlib
+    import hmac
+    from utils.metrics import record_startup
+    IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 except Exception as e:
     logger.error(f"CRITICAL IMPORT ERROR: {e}")
     # Keep the container alive to see logs
@@ -40,70 +61,380 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Multipart bodies are capped before Starlette spools them to disk
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/upload-audio/": Config.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/batches/": Config.MAX_BATCH_BYTES,
+    },
+)
+
+def _store_upload(file_path: str, audio_sha256: str) -> str:
+    """Moves a received recording into the artifact store. Returns the name tasks get."""
+    meta = get_artifact_store().put_file(file_path, os.path.basename(file_path), KIND_UPLOAD, digest=audio_sha256)
+    return meta["name"]
+
+# Client-chosen idempotency keys are stored in Redis; keep them bounded
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+
+def _check_idempotency_key(idempotency_key: Optional[str]):
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+
+def _submit_audio(audio_name: str, audio_sha256: str, idempotency_key: Optional[str] = None) -> dict:
+    """
+    Starts processing an upload, or attaches to the job already running (or
+    done) for the same Idempotency-Key, or else the same audio content.
+    """
+    key = f"client:{idempotency_key}" if idempotency_key else f"audio:{audio_sha256}"
+    task, attached = submit_once(key, PROCESS_AUDIO, audio_name, audio_sha256=audio_sha256)
+    if not attached:
+        return {"task_id": task.id, "message": "Processing started"}
+    logger.info(f"Attached repeat submission {key} to task {task.id}")
+    message = "Already processed" if task.ready() else "Already processing"
+    return {"task_id": task.id, "message": message, "deduplicated": True}
+
+async def _janitor_loop():
+    """Periodic artifact/upload cleanup; one replica per interval does the work."""
+    while True:
+        try:
+            if first_seen("janitor:sweep", int(max(1, Config.JANITOR_INTERVAL - 60))):
+                stats = await asyncio.to_thread(run_janitor)
+                stats["upload_locks_pruned"] = prune_session_locks()
+                logger.info(f"🧹 Janitor pass: {stats}")
+        except Exception as e:
+            logger.error(f"Janitor pass failed: {e}")
+        await asyncio.sleep(Config.JANITOR_INTERVAL)
+
+@app.on_event("startup")
+async def record_api_startup():
+    app.state.startup = record_startup("api", IMPORT_SECONDS)
+
+@app.on_event("startup")
+async def start_janitor():
+    if Config.JANITOR_INTERVAL > 0:
+        app.state.janitor = asyncio.create_task(_janitor_loop())
+
 @app.get("/")
 async def root():
     return {"message": "Voice-to-Presentation API is running"}
 
 @app.post("/upload-audio/")
-async def upload_audio(file: UploadFile = File(...)):
+async def upload_audio(file: UploadFile = File(...), idempotency_key: Optional[str] = Header(None)):
     """
-    Endpoint to upload audio from the web frontend.
+    Endpoint to upload audio from the web frontend. Repeats of the same audio or
+    Idempotency-Key get the task id of the first job instead of a new one.
     """
+    _check_idempotency_key(idempotency_key)
     try:
-        file_id = str(uuid.uuid4())
-        extension = os.path.splitext(file.filename)[1]
-        if not extension:
-            extension = ".webm" # Default to webm if no extension
-            
-        file_path = os.path.join(Config.UPLOAD_DIR, f"{file_id}{extension}")
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # FIX PERMISSIONS for Docker volumes
-        try:
-            os.chmod(file_path, 0o666) # Read/Write for everyone
-        except Exception as perm_err:
-            logger.warning(f"Could not change permissions for {file_path}: {perm_err}")
+        with span(STAGE_UPLOAD):
+            file_path, audio_sha256 = await save_upload_file(file, Config.MAX_UPLOAD_BYTES)
+            audio_name = await asyncio.to_thread(_store_upload, file_path, audio_sha256)
 
         # Trigger background task
-        task = process_audio_presentation.delay(file_path)
-        
-        return {"task_id": task.id, "message": "Processing started"}
+        return await asyncio.to_thread(_submit_audio, audio_name, audio_sha256, idempotency_key)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading audio: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class ChunkedUploadRequest(BaseModel):
+    filename: str = "recording.webm"
+    total_size: int
+
+@app.post("/upload-audio/chunked")
+async def start_chunked_upload(body: ChunkedUploadRequest):
+    """
+    Starts a resumable upload for long recordings sent over slow links.
+    """
+    try:
+        upload_id = await asyncio.to_thread(create_chunked_upload, body.filename, body.total_size)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"upload_id": upload_id, "offset": 0, "chunk_size": Config.UPLOAD_CHUNK_SIZE}
+
+@app.get("/upload-audio/chunked/{upload_id}")
+async def get_chunked_upload(upload_id: str):
+    """
+    Returns how many bytes were received, so a client can resume after a dropped connection.
+    """
+    try:
+        return {"upload_id": upload_id, "offset": await asyncio.to_thread(chunked_upload_offset, upload_id)}
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.put("/upload-audio/chunked/{upload_id}")
+async def put_chunk(upload_id: str, offset: int, request: Request):
+    """
+    Appends the raw request body at `offset`, streaming it straight to disk.
+    """
+    try:
+        with span(STAGE_UPLOAD):
+            new_offset = await append_chunk(upload_id, offset, request.stream())
+        return {"upload_id": upload_id, "offset": new_offset}
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"error": str(e), "offset": e.expected})
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.delete("/upload-audio/chunked/{upload_id}")
+async def abort_upload(upload_id: str):
+    """
+    Abandons a chunked upload and deletes what was received.
+    """
+    try:
+        await asyncio.to_thread(abort_chunked_upload, upload_id)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"upload_id": upload_id, "status": "aborted"}
+
+@app.post("/upload-audio/chunked/{upload_id}/complete")
+async def finish_chunked_upload(upload_id: str, idempotency_key: Optional[str] = Header(None)):
+    """
+    Finalizes a chunked upload and starts processing it (deduplicated like /upload-audio/).
+    """
+    _check_idempotency_key(idempotency_key)
+    try:
+        file_path, audio_sha256 = await asyncio.to_thread(complete_chunked_upload, upload_id)
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"error": "Upload incomplete", "offset": e.expected})
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    audio_name = await asyncio.to_thread(_store_upload, file_path, audio_sha256)
+    return await asyncio.to_thread(_submit_audio, audio_name, audio_sha256, idempotency_key)
+
+@app.post("/batches/")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """
+    Starts one presentation per audio file (zips are unpacked) as a single batch.
+    """
+    saved = []
+    try:
+        for upload in files:
+            remaining = Config.MAX_BATCH_FILES - len(saved)
+            if remaining <= 0:
+                raise UploadTooLarge(f"Batch exceeds the {Config.MAX_BATCH_FILES} file limit")
+            with span(STAGE_UPLOAD):
+                file_path, audio_sha256 = await save_upload_file(upload, Config.MAX_UPLOAD_BYTES)
+            source = os.path.basename(upload.filename or "recording.webm")
+            if not source.lower().endswith(".zip"):
+                saved.append((file_path, audio_sha256, source))
+                continue
+            try:
+                saved.extend(await asyncio.to_thread(
+                    extract_audio_zip, file_path, remaining, Config.MAX_UPLOAD_BYTES
+                ))
+            finally:
+                os.remove(file_path)
+    except (UploadTooLarge, zipfile.BadZipFile) as e:
+        for file_path, _, _ in saved:
+            os.remove(file_path)
+        status_code = 413 if isinstance(e, UploadTooLarge) else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+    if not saved:
+        raise HTTPException(status_code=400, detail="No audio files found")
+
+    saved = [
+        (await asyncio.to_thread(_store_upload, file_path, audio_sha256), audio_sha256, source)
+        for file_path, audio_sha256, source in saved
+    ]
+    manifest = await asyncio.to_thread(start_batch, celery_app, PROCESS_AUDIO, saved)
+    return {
+        "batch_id": manifest["batch_id"],
+        "task_ids": [job["task_id"] for job in manifest["jobs"]],
+        "message": f"Processing {len(saved)} recordings",
+    }
+
+@app.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """
+    Aggregate progress of a batch, plus the state of each recording in it.
+    """
+    status = await asyncio.to_thread(batch_status, celery_app, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+@app.get("/batches/{batch_id}/download")
+async def download_batch(batch_id: str, request: Request):
+    """
+    One zip with every PPTX/PDF of a finished batch.
+    """
+    status = await asyncio.to_thread(batch_status, celery_app, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if status["status"] != "SUCCESS":
+        raise HTTPException(status_code=409, detail=f"Batch still running ({status['finished']}/{status['total']})")
+    meta = await asyncio.to_thread(build_batch_zip, status)
+    return _artifact_response(meta, request, f"presentations_{batch_id}.zip")
+
+def _task_status(task_id: str) -> dict:
+    task_result = celery_app.AsyncResult(task_id)
+
+    # When state is PROGRESS, 'info' contains the meta dict
+    # When state is SUCCESS, 'result' contains the return value
+    return {
+        "task_id": task_id,
+        "status": task_result.status,
+        "result": task_result.result if task_result.ready() else None,
+        "info": task_result.info if isinstance(task_result.info, dict) else str(task_result.info)
+    }
+
 @app.get("/task/{task_id}")
 async def get_task_status(task_id: str):
     """
     Check the status of a Celery task.
     """
     try:
-        from tasks import celery_app
-        task_result = celery_app.AsyncResult(task_id)
-        
-        # When state is PROGRESS, 'info' contains the meta dict
-        # When state is SUCCESS, 'result' contains the return value
-        
-        response = {
-            "task_id": task_id,
-            "status": task_result.status,
-            "result": task_result.result if task_result.ready() else None,
-            "info": task_result.info if isinstance(task_result.info, dict) else str(task_result.info)
-        }
-        return response
+        return _task_status(task_id)
     except Exception as e:
         logger.error(f"Error getting task status: {e}")
         return {"status": "FAILURE", "error": str(e)}
 
+# Seconds between keep-alives; each one also re-checks the stored state in case an event was missed
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/task/{task_id}/events")
+async def stream_task_status(task_id: str, request: Request):
+    """
+    Server-Sent Events stream of task state changes, in the same shape as /task/{task_id}.
+    The stream ends once the task reaches SUCCESS or FAILURE.
+    """
+    def _sse(event: dict) -> str:
+        return f"data: {json.dumps(event, default=str)}\n\n"
+
+    async def event_stream():
+        queue = progress_hub.subscribe(task_id)
+        try:
+            last = await asyncio.to_thread(_task_status, task_id)
+            yield _sse(last)
+            while last["status"] not in ("SUCCESS", "FAILURE"):
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    event = await asyncio.to_thread(_task_status, task_id)
+                    if event == last:
+                        yield ": keep-alive\n\n"
+                        continue
+                last = event
+                yield _sse(event)
+        finally:
+            progress_hub.unsubscribe(task_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the shared caches, plus Gemini fallback/repair counters.
+    """
+    from services.image_cache import get_image_cache
+    from services.analysis_cache import get_analysis_cache
+    from utils.counters import get_counters
+    return {
+        "images": get_image_cache().stats(),
+        "analysis": get_analysis_cache().stats(),
+        "gemini": get_counters("gemini."),
+    }
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def _parse_range(header: str, size: int):
+    """
+    (start, end) for a single-range `bytes=` header, None to send the whole file
+    (absent or multi-range), or "unsatisfiable".
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        return (max(0, size - length), size - 1) if length and size else "unsatisfiable"
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+def _artifact_response(meta: dict, request: Request, download_name: str):
+    """
+    Streams a stored artifact with a content-hash ETag, answering conditional
+    (If-None-Match/If-Range) and single byte-range requests.
+    """
+    store = get_artifact_store()
+    etag = f'"{meta["digest"]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    size = meta["size"]
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if if_range is None or if_range.strip() == etag:
+        byte_range = _parse_range(request.headers.get("range"), size)
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        store.iter_range(meta, start, end),
+        status_code=status_code,
+        media_type=meta["content_type"],
+        headers=headers,
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: API-side stage histograms plus the shared pipeline counters.
+    Workers export their stage histograms on WORKER_METRICS_PORT.
+    """
+    body, content_type = await asyncio.to_thread(metrics_payload)
+    if body is None:
+        raise HTTPException(status_code=501, detail="prometheus_client is not installed")
+    return Response(content=body, media_type=content_type)
+
 @app.get("/download/{filename}")
-async def download_pptx(filename: str):
+async def download_pptx(filename: str, request: Request):
     """
-    Download the generated PPTX file.
+    Download a generated PPTX/PDF. Supports ETag revalidation and byte ranges,
+    so interrupted downloads on mobile can resume.
     """
-    file_path = os.path.join(Config.OUTPUT_DIR, filename)
-    if os.path.exists(file_path):
+    meta = await asyncio.to_thread(get_artifact_store().stat, filename)
+    if meta is not None and meta["kind"] != KIND_UPLOAD:
+        return _artifact_response(meta, request, filename)
+
+    # Decks generated before the artifact store
+    file_path = os.path.join(Config.OUTPUT_DIR, os.path.basename(filename))
+    if meta is None and os.path.isfile(file_path):
         return FileResponse(file_path, filename=filename)
     raise HTTPException(status_code=404, detail="File not found")
 
@@ -125,45 +456,69 @@ async def verify_webhook(request: Request):
             raise HTTPException(status_code=403, detail="Verification failed")
     return {"status": "ok"}
 
+def _dispatch_whatsapp_messages(data: dict) -> int:
+    """
+    Enqueues work for every new message in the payload. Returns how many were enqueued.
+    """
+    queued = 0
+    for entry in data.get('entry') or []:
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            for message in value.get('messages') or []:
+                message_id = message.get('id')
+                sender_id = message.get('from')
+                if not message_id or not sender_id:
+                    continue
+
+                # Meta redelivers slow or unacknowledged webhooks; handle each message once
+                dedupe_key = f"whatsapp:{message_id}"
+                if not first_seen(dedupe_key, Config.WHATSAPP_DEDUPE_TTL):
+                    logger.info(f"Skipping duplicate WhatsApp message {message_id}")
+                    continue
+
+                try:
+                    if message.get('type') == 'audio' and message.get('audio', {}).get('id'):
+                        send_task(INGEST_WHATSAPP_AUDIO, sender_id, message['audio']['id'])
+                    else:
+                        send_task(SEND_WHATSAPP_TEXT, sender_id, "Please send an audio message to generate a presentation.")
+                except Exception:
+                    # Let Meta's redelivery try this message again
+                    forget(dedupe_key)
+                    raise
+                queued += 1
+    return queued
+
+def _valid_signature(body: bytes, signature: str) -> bool:
+    if not Config.WHATSAPP_APP_SECRET:
+        return True
+    expected = "sha256=" + hmac.new(Config.WHATSAPP_APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
 @app.post("/webhook")
 async def receive_whatsapp_message(request: Request):
     """
     Receives messages from WhatsApp.
+
+    Only validates, dedupes and enqueues; replies and media downloads run in Celery
+    so Meta gets its acknowledgement right away.
     """
+    body = await request.body()
+    if not _valid_signature(body, request.headers.get("X-Hub-Signature-256")):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+
     try:
-        data = await request.json()
-        
-        try:
-            entry = data['entry'][0]
-            changes = entry['changes'][0]
-            value = changes['value']
-            messages = value.get('messages')
-            
-            if messages:
-                message = messages[0]
-                sender_id = message['from']
-                
-                if message['type'] == 'audio':
-                    audio_id = message['audio']['id']
-                    
-                    # Reply "Processing..."
-                    send_whatsapp_message(sender_id, "Processing your audio presentation...")
-                    
-                    # Download audio
-                    audio_filename = f"{audio_id}.ogg"
-                    audio_path = os.path.join(Config.UPLOAD_DIR, audio_filename)
-                    download_media(audio_id, audio_path)
-                    
-                    # Trigger background task with WhatsApp recipient
-                    process_audio_presentation.delay(audio_path, whatsapp_to=sender_id)
-                    
-                else:
-                    send_whatsapp_message(sender_id, "Please send an audio message to generate a presentation.")
-                    
-        except Exception as e:
-            print(f"Error processing webhook logic: {e}")
-            
-        return {"status": "received"}
-    except Exception as e:
+        data = json.loads(body)
+        if not isinstance(data, dict):
+            raise ValueError("Payload must be a JSON object")
+    except ValueError as e:
         print(f"Error in webhook endpoint: {e}")
         return {"status": "error", "detail": str(e)}
+
+    try:
+        queued = await asyncio.to_thread(_dispatch_whatsapp_messages, data)
+    except Exception as e:
+        # Non-2xx makes Meta redeliver; already-queued messages are deduped then
+        print(f"Error processing webhook logic: {e}")
+        raise HTTPException(status_code=503, detail="Could not enqueue messages")
+
+    return {"status": "received", "queued": queued}
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from config import Config
+from utils.counters import incr, get_counters
+from utils.redis_client import get_redis
+
+KEY_PREFIX = "analysis_cache:"
+
+def hash_audio_file(audio_path: str) -> str:
+    """SHA-256 of the audio bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Caches parsed presentation JSON by (audio SHA-256, prompt version, model name).
+
+    Entries go to Redis with a TTL when it is reachable, otherwise to JSON files
+    on disk whose age is checked on read.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(audio_sha256: str, prompt_version: str, model_name: str) -> str:
+        return f"{audio_sha256}:{prompt_version}:{model_name}"
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def _read(self, key: str):
+        r = get_redis()
+        if r is not None:
+            try:
+                raw = r.get(KEY_PREFIX + key)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                print(f"⚠️ Analysis cache read failed: {e}")
+                return None
+
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) <= self.ttl:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            os.remove(path)
+        except (FileNotFoundError, ValueError):
+            pass
+        return None
+
+    def lookup(self, keys: list):
+        """Returns the first cached presentation dict among keys, or None. Counts one hit or miss."""
+        for key in keys:
+            data = self._read(key)
+            if data is not None:
+                incr("analysis_cache.hits")
+                return data
+        incr("analysis_cache.misses")
+        return None
+
+    def put(self, key: str, data: dict):
+        payload = json.dumps(data, ensure_ascii=False)
+        r = get_redis()
+        if r is not None:
+            try:
+                r.setex(KEY_PREFIX + key, self.ttl, payload)
+                return
+            except Exception as e:
+                print(f"⚠️ Analysis cache write to Redis failed, using disk: {e}")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        counters = get_counters("analysis_cache.")
+        hits = counters.get("analysis_cache.hits", 0)
+        misses = counters.get("analysis_cache.misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+_cache = None
+
+def get_analysis_cache() -> AnalysisCache:
+    """Returns the process-wide analysis cache configured from Config."""
+    global _cache
+    if _cache is None:
+        _cache = AnalysisCache(Config.ANALYSIS_CACHE_DIR, Config.ANALYSIS_CACHE_TTL)
+    return _cache
@@ -0,0 +1,453 @@
+import contextlib
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from config import Config
+from utils.redis_client import get_redis
+
+READ_CHUNK = 64 * 1024
+
+# Not in every system mime table (e.g. slim images)
+mimetypes.add_type("application/vnd.openxmlformats-officedocument.presentationml.presentation", ".pptx")
+
+# Artifact kinds and how long each is kept after it was stored
+KIND_UPLOAD = "upload"
+KIND_PPTX = "pptx"
+KIND_PDF = "pdf"
+KIND_BATCH = "batch"
+
+# Objects without a name pointing at them are only deleted after this long,
+# so a put that has written its object but not yet its name is never raced
+ORPHAN_GRACE_SECONDS = 3600
+
+# Size-based eviction never touches uploads (a job may still be reading one; they
+# expire by UPLOAD_TTL) nor outputs younger than this, which a job may still be
+# converting or delivering
+EVICT_MIN_AGE_SECONDS = 3600
+
+# A put that reuses an existing object and the sweep that would delete it take the
+# same per-object Redis lock; the put leaves a marker the sweep respects
+OBJECT_LOCK_PREFIX = "artifact_store:lock:"
+OBJECT_REUSED_PREFIX = "artifact_store:reused:"
+
+@contextlib.contextmanager
+def _object_lock(r, key: str):
+    """Per-object lock shared by every process; a no-op without Redis."""
+    lock = None
+    if r is not None:
+        try:
+            lock = r.lock(f"{OBJECT_LOCK_PREFIX}{key}", timeout=60, blocking_timeout=30)
+            if not lock.acquire():
+                print(f"⚠️ Timed out waiting for the lock on {key}, continuing without it")
+                lock = None
+        except Exception as e:
+            print(f"⚠️ Artifact lock for {key} unavailable: {e}")
+            lock = None
+    try:
+        yield
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except Exception as e:
+                print(f"⚠️ Could not release the lock on {key}: {e}")
+
+class LocalBackend:
+    """Keys are paths under root on a local or shared volume."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _atomic_target(self, key: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path, f"{path}.{uuid.uuid4().hex}.tmp"
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_bytes(self, key: str, data: bytes):
+        path, tmp_path = self._atomic_target(key)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path) # Atomic, so concurrent readers never see partial files
+
+    def put_file(self, key: str, source_path: str, move: bool = False):
+        path, tmp_path = self._atomic_target(key)
+        if move:
+            shutil.move(source_path, tmp_path) # A rename when both are on the same volume
+        else:
+            shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def read(self, key: str):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def iter_range(self, key: str, start: int, end: int):
+        """Yields bytes start..end (inclusive)."""
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str):
+        """Yields (key, size, modified_at) for every key under prefix."""
+        base = self._path(prefix)
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield key, stat.st_size, stat.st_mtime
+
+    @contextlib.contextmanager
+    def local_file(self, key: str):
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(key)
+        yield path
+
+    def location(self, key: str) -> str:
+        return self._path(key)
+
+class S3Backend:
+    """Keys are objects in one bucket of S3 or an S3-compatible server (e.g. MinIO)."""
+
+    def __init__(self, bucket: str, endpoint_url: str = None):
+        # Imported here: boto3 is slow to load and only needed with ARTIFACT_BACKEND=s3
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("ARTIFACT_BACKEND=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def put_file(self, key: str, source_path: str, move: bool = False):
+        self.client.upload_file(source_path, self.bucket, key)
+        if move:
+            os.remove(source_path)
+
+    def read(self, key: str):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def iter_range(self, key: str, start: int, end: int):
+        body = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}")["Body"]
+        yield from body.iter_chunks(READ_CHUNK)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def list(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"], item["Size"], item["LastModified"].timestamp()
+
+    @contextlib.contextmanager
+    def local_file(self, key: str):
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, key, path)
+            yield path
+        finally:
+            os.remove(path)
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+class ArtifactStore:
+    """
+    Content-addressed store for uploaded audio, decks, PDFs and batch zips.
+
+    Each object is written once under its SHA-256 (objects/xx/<sha><ext>), so
+    identical content shares storage. The names clients and tasks use are small
+    JSON records (names/<name>.json) pointing at an object. sweep() expires names
+    by kind and age, enforces a total size limit and deletes unreferenced objects.
+    """
+
+    def __init__(self, backend, ttls: dict, max_bytes: int):
+        self.backend = backend
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def _object_key(digest: str, extension: str) -> str:
+        return f"objects/{digest[:2]}/{digest}{extension}"
+
+    @staticmethod
+    def _name_key(filename: str) -> str:
+        if not filename or "/" in filename or filename.startswith("."):
+            raise ValueError(f"Invalid artifact name: {filename!r}")
+        return f"names/{filename}.json"
+
+    def _register(self, filename: str, kind: str, digest: str, extension: str, size: int) -> dict:
+        meta = {
+            "name": filename,
+            "kind": kind,
+            "digest": digest,
+            "key": self._object_key(digest, extension),
+            "size": size,
+            "content_type": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            "created_at": time.time(),
+        }
+        self.backend.put_bytes(self._name_key(filename), json.dumps(meta).encode())
+        return meta
+
+    def _reuse_existing(self, key: str) -> bool:
+        """
+        True if the object already exists; it is then marked so a concurrent sweep
+        leaves it alone until the new name pointing at it has been registered.
+        """
+        r = get_redis()
+        with _object_lock(r, key):
+            if not self.backend.exists(key):
+                return False
+            if r is not None:
+                try:
+                    r.set(f"{OBJECT_REUSED_PREFIX}{key}", 1, ex=ORPHAN_GRACE_SECONDS)
+                except Exception as e:
+                    print(f"⚠️ Could not mark {key} as reused: {e}")
+            return True
+
+    def put_bytes(self, data: bytes, filename: str, kind: str) -> dict:
+        """Stores data under filename, reusing an identical object if there is one. Returns its metadata."""
+        digest = hashlib.sha256(data).hexdigest()
+        extension = os.path.splitext(filename)[1]
+        key = self._object_key(digest, extension)
+        if not self._reuse_existing(key):
+            self.backend.put_bytes(key, data)
+        meta = self._register(filename, kind, digest, extension, len(data))
+        # Without Redis nothing stops a sweep in between: check the object survived
+        if not self.backend.exists(key):
+            self.backend.put_bytes(key, data)
+        return meta
+
+    def put_file(self, path: str, filename: str, kind: str, digest: str = None, move: bool = True) -> dict:
+        """
+        Stores a file under filename (moving it in by default). digest, if already
+        known, skips re-hashing. Returns its metadata.
+        """
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+        size = os.path.getsize(path)
+        extension = os.path.splitext(filename)[1]
+        key = self._object_key(digest, extension)
+        if not self._reuse_existing(key):
+            self.backend.put_file(key, path, move=move)
+            return self._register(filename, kind, digest, extension, size)
+
+        meta = self._register(filename, kind, digest, extension, size)
+        # Without Redis nothing stops a sweep in between: check the object survived
+        if not self.backend.exists(key):
+            self.backend.put_file(key, path, move=move)
+        elif move:
+            os.remove(path) # Duplicate content: keep the stored copy
+        return meta
+
+    def stat(self, filename: str):
+        """Metadata for a stored name, or None."""
+        try:
+            raw = self.backend.read(self._name_key(filename))
+        except ValueError:
+            return None
+        return json.loads(raw) if raw else None
+
+    @contextlib.contextmanager
+    def local_path(self, filename: str):
+        """A local file path for a stored name (a temp copy for remote backends)."""
+        meta = self.stat(filename)
+        if meta is None:
+            raise FileNotFoundError(filename)
+        with self.backend.local_file(meta["key"]) as path:
+            yield path
+
+    def iter_range(self, meta: dict, start: int = 0, end: int = None):
+        end = meta["size"] - 1 if end is None else end
+        if end < start:
+            return iter(())
+        return self.backend.iter_range(meta["key"], start, end)
+
+    def location(self, meta: dict) -> str:
+        """Where the object lives (a path, or an s3:// URL), for logs and debug output."""
+        return self.backend.location(meta["key"])
+
+    def delete(self, filename: str):
+        """Drops a name; its object goes at the next sweep if nothing else points at it."""
+        self.backend.delete(self._name_key(filename))
+
+    def _delete_unreused(self, key: str) -> bool:
+        """Deletes an unreferenced object unless a put has just reused it. Returns whether it was deleted."""
+        r = get_redis()
+        with _object_lock(r, key):
+            if r is not None:
+                try:
+                    if r.exists(f"{OBJECT_REUSED_PREFIX}{key}"):
+                        return False
+                except Exception as e:
+                    print(f"⚠️ Could not check whether {key} was reused: {e}")
+            self.backend.delete(key)
+            return True
+
+    def sweep(self) -> dict:
+        """
+        Janitor pass: expires names past their kind's TTL, evicts the oldest names
+        while objects exceed max_bytes, then deletes unreferenced objects.
+        """
+        now = time.time()
+        names = []
+        for key, _, _ in self.backend.list("names/"):
+            raw = self.backend.read(key)
+            if raw:
+                names.append(json.loads(raw))
+
+        expired = 0
+        live = []
+        for meta in names:
+            ttl = self.ttls.get(meta["kind"])
+            if ttl and now - meta["created_at"] > ttl:
+                self.delete(meta["name"])
+                expired += 1
+            else:
+                live.append(meta)
+
+        objects = {key: (size, modified) for key, size, modified in self.backend.list("objects/")}
+        referenced = {meta["key"] for meta in live}
+        total = sum(size for key, (size, _) in objects.items() if key in referenced)
+
+        # Over the size limit: drop the oldest names until their objects fit, skipping
+        # anything a running job may still need
+        evicted = 0
+        evictable = sorted(
+            (meta for meta in live
+             if meta["kind"] != KIND_UPLOAD and now - meta["created_at"] > EVICT_MIN_AGE_SECONDS),
+            key=lambda meta: meta["created_at"],
+        )
+        while total > self.max_bytes and evictable:
+            meta = evictable.pop(0)
+            self.delete(meta["name"])
+            live.remove(meta)
+            evicted += 1
+            if all(other["key"] != meta["key"] for other in live):
+                referenced.discard(meta["key"])
+                total -= objects.get(meta["key"], (0, 0))[0]
+
+        # Objects whose last name was dropped in this pass go now; other unreferenced
+        # objects (and temp files) may belong to a put in progress
+        dropped = {meta["key"] for meta in names} - referenced
+        deleted_bytes = 0
+        deleted_objects = 0
+        for key, (size, modified) in objects.items():
+            if key in referenced:
+                continue
+            if key not in dropped and now - modified < ORPHAN_GRACE_SECONDS:
+                continue
+            if not self._delete_unreused(key):
+                continue
+            deleted_objects += 1
+            deleted_bytes += size
+
+        stats = {
+            "names_expired": expired,
+            "names_evicted": evicted,
+            "objects_deleted": deleted_objects,
+            "bytes_freed": deleted_bytes,
+            "bytes_stored": total,
+        }
+        if expired or evicted or deleted_objects:
+            print(f"🧹 Artifact sweep: {stats}")
+        return stats
+
+def sweep_local_leftovers(directory: str, max_age: float, skip: tuple = ()) -> int:
+    """
+    Deletes plain files older than max_age in directory and its subdirectories
+    (stale upload sessions, files from crashed jobs, pre-store outputs). Returns how many.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    now = time.time()
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in skip]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+_store = None
+
+def get_artifact_store() -> ArtifactStore:
+    """Returns the process-wide artifact store configured from Config."""
+    global _store
+    if _store is None:
+        if Config.ARTIFACT_BACKEND == "s3":
+            backend = S3Backend(Config.ARTIFACT_S3_BUCKET, Config.ARTIFACT_S3_ENDPOINT)
+        else:
+            backend = LocalBackend(Config.ARTIFACT_DIR)
+        ttls = {
+            KIND_UPLOAD: Config.UPLOAD_TTL,
+            KIND_PPTX: Config.ARTIFACT_TTL,
+            KIND_PDF: Config.ARTIFACT_TTL,
+            KIND_BATCH: Config.ARTIFACT_TTL,
+        }
+        _store = ArtifactStore(backend, ttls, Config.ARTIFACT_MAX_BYTES)
+    return _store
+
+def run_janitor() -> dict:
+    """One full cleanup pass: the artifact store plus leftovers in the upload/output volumes."""
+    store = get_artifact_store()
+    stats = store.sweep()
+    skip = (os.path.abspath(Config.ARTIFACT_DIR),)
+    stats["local_files_removed"] = (
+        sweep_local_leftovers(Config.UPLOAD_DIR, Config.UPLOAD_TTL, skip)
+        + sweep_local_leftovers(Config.OUTPUT_DIR, Config.ARTIFACT_TTL, skip)
+    )
+    return stats
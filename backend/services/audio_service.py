@@ -0,0 +1,176 @@
+import os
+import subprocess
+import tempfile
+import time
+from config import Config
+from utils.counters import incr
+
+# Speech quieter than the threshold for this long counts as silence at the edges
+EDGE_SILENCE_SECONDS = 0.2
+
+def _filter_chain(trim_end: float = None) -> str:
+    threshold = f"{Config.AUDIO_SILENCE_THRESHOLD_DB}dB"
+    # Downmix and resample first so the rest of the chain stays small
+    filters = [f"aformat=channel_layouts=mono:sample_rates={Config.AUDIO_SAMPLE_RATE}"]
+    if trim_end is not None:
+        # Trailing silence, located beforehand (see _trailing_silence_start); cut on input time
+        filters.append(f"atrim=end={trim_end:.3f}")
+    if Config.AUDIO_TRIM_PAUSES:
+        # Shorten every internal pause to AUDIO_MAX_PAUSE seconds
+        filters.append(
+            f"silenceremove=stop_periods=-1:stop_duration={Config.AUDIO_MAX_PAUSE}"
+            f":stop_threshold={threshold}:stop_silence={Config.AUDIO_MAX_PAUSE}"
+        )
+    # Leading silence
+    filters.append(
+        f"silenceremove=start_periods=1:start_duration={EDGE_SILENCE_SECONDS}:start_threshold={threshold}"
+    )
+    return ",".join(filters)
+
+def _trailing_silence_start(audio_path: str):
+    """
+    Where the recording's trailing silence starts, in seconds, or None if it
+    does not end in silence. silencedetect streams, unlike reversing the whole
+    decoded recording to trim its end with silenceremove.
+    """
+    cmd = [
+        Config.FFMPEG_BIN, "-hide_banner", "-nostats", "-loglevel", "info",
+        "-i", audio_path,
+        "-vn", "-af",
+        f"aformat=channel_layouts=mono:sample_rates={Config.AUDIO_SAMPLE_RATE},"
+        f"silencedetect=noise={Config.AUDIO_SILENCE_THRESHOLD_DB}dB:d={EDGE_SILENCE_SECONDS}",
+        "-f", "null", "-",
+    ]
+    process = subprocess.run(cmd, capture_output=True, text=True, timeout=Config.AUDIO_PREPROCESS_TIMEOUT)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip()[-500:] or f"ffmpeg exited with {process.returncode}")
+
+    last_start = last_end = None
+    for line in process.stderr.splitlines():
+        if "silence_start:" in line:
+            last_start, last_end = float(line.rsplit("silence_start:", 1)[1].split()[0]), None
+        elif "silence_end:" in line:
+            last_end = float(line.rsplit("silence_end:", 1)[1].split("|")[0].strip())
+    if last_start is None:
+        return None
+    if last_end is None:
+        return last_start # Still silent at the end of the stream
+    # Newer ffmpeg closes a silence at end of stream: it is trailing if it reaches the end
+    duration = probe_duration(audio_path)
+    if duration is not None and last_end >= duration - EDGE_SILENCE_SECONDS:
+        return last_start
+    return None
+
+def preprocess_audio(audio_path: str):
+    """
+    Re-encodes a recording for speech analysis: mono, AUDIO_SAMPLE_RATE, Opus at
+    AUDIO_BITRATE, with leading/trailing silence trimmed.
+
+    Returns (path_to_upload, report). The path is a temp file the caller must
+    delete, or audio_path itself when pre-processing is off, fails, or would
+    not make the file smaller.
+    """
+    original_bytes = os.path.getsize(audio_path)
+    report = {"applied": False, "original_bytes": original_bytes, "processed_bytes": original_bytes, "bytes_saved": 0}
+    if not Config.AUDIO_PREPROCESS_ENABLED:
+        return audio_path, report
+
+    started = time.monotonic()
+    try:
+        trim_end = _trailing_silence_start(audio_path)
+    except Exception as e:
+        print(f"⚠️ Could not detect trailing silence, keeping it: {e}")
+        trim_end = None
+    if trim_end is not None and trim_end <= 0:
+        # All silence
+        return audio_path, report
+
+    fd, output_path = tempfile.mkstemp(prefix="speech-", suffix=".ogg")
+    os.close(fd)
+    cmd = [
+        Config.FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+        "-i", audio_path,
+        "-vn", "-af", _filter_chain(trim_end),
+        "-c:a", "libopus", "-b:a", Config.AUDIO_BITRATE, "-application", "voip",
+        output_path,
+    ]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=Config.AUDIO_PREPROCESS_TIMEOUT)
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.strip() or f"ffmpeg exited with {process.returncode}")
+        processed_bytes = os.path.getsize(output_path)
+    except Exception as e:
+        print(f"⚠️ Audio pre-processing failed, uploading the original: {e}")
+        os.remove(output_path)
+        return audio_path, report
+
+    report["seconds"] = round(time.monotonic() - started, 3)
+    if processed_bytes == 0 or processed_bytes >= original_bytes:
+        # All silence, or already a compact speech encoding
+        os.remove(output_path)
+        return audio_path, report
+
+    report.update(applied=True, processed_bytes=processed_bytes, bytes_saved=original_bytes - processed_bytes)
+    incr("audio.bytes_in", original_bytes)
+    incr("audio.bytes_saved", report["bytes_saved"])
+    print(
+        f"🎚️ Audio pre-processed: {original_bytes} -> {processed_bytes} bytes "
+        f"({report['bytes_saved'] / original_bytes:.0%} smaller) in {report['seconds']}s"
+    )
+    return output_path, report
+
+def estimate_upload_savings(report: dict, upload_seconds: float) -> dict:
+    """
+    Adds the measured upload time and the estimated time saved (same throughput
+    applied to the bytes that were not sent) to a pre-processing report.
+    """
+    report["upload_seconds"] = round(upload_seconds, 3)
+    if report["applied"] and report["processed_bytes"]:
+        saved = upload_seconds * report["bytes_saved"] / report["processed_bytes"]
+        report["upload_seconds_saved"] = round(saved, 3)
+    else:
+        report["upload_seconds_saved"] = 0.0
+    return report
+
+def probe_duration(audio_path: str):
+    """Duration in seconds according to ffprobe, or None if it cannot be read."""
+    cmd = [
+        Config.FFPROBE_BIN, "-v", "error",
+        "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
+        audio_path,
+    ]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        return float(process.stdout.strip())
+    except Exception as e:
+        print(f"⚠️ Could not read audio duration of {audio_path}: {e}")
+        return None
+
+def segment_bounds(duration: float, segment_seconds: float, overlap: float) -> list:
+    """[(start, end)] windows of segment_seconds covering duration, each overlapping the previous one."""
+    step = max(1.0, segment_seconds - overlap)
+    bounds = []
+    start = 0.0
+    while True:
+        end = min(duration, start + segment_seconds)
+        bounds.append((start, end))
+        if end >= duration:
+            return bounds
+        start += step
+
+def extract_segment(audio_path: str, start: float, end: float) -> str:
+    """Cuts [start, end) out of a recording into a speech-encoded temp file. The caller deletes it."""
+    fd, output_path = tempfile.mkstemp(prefix="segment-", suffix=".ogg")
+    os.close(fd)
+    cmd = [
+        Config.FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", audio_path,
+        "-vn", "-ac", "1", "-ar", str(Config.AUDIO_SAMPLE_RATE),
+        "-c:a", "libopus", "-b:a", Config.AUDIO_BITRATE, "-application", "voip",
+        output_path,
+    ]
+    process = subprocess.run(cmd, capture_output=True, text=True, timeout=Config.AUDIO_PREPROCESS_TIMEOUT)
+    if process.returncode != 0:
+        os.remove(output_path)
+        raise RuntimeError(process.stderr.strip() or f"ffmpeg exited with {process.returncode}")
+    return output_path
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import time
+import zipfile
+from celery import group
+from services.artifact_store import get_artifact_store, KIND_BATCH
+
+KEY_PREFIX = "batch:"
+
+# States after which a job will not change any more
+FINISHED_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+def start_batch(celery_app, task_name: str, items: list) -> dict:
+    """
+    Fans a batch out as one Celery group of pipeline runs of the task called
+    task_name. items are (audio_name, audio_sha256, source_name) tuples.
+    Returns the stored manifest.
+
+    Each run keeps its own task id (the chain inherits it), so the manifest only
+    needs those ids to report the batch.
+    """
+    result = group(
+        celery_app.signature(task_name, args=(name,), kwargs={"audio_sha256": sha}) for name, sha, _ in items
+    ).apply_async()
+    manifest = {
+        "batch_id": result.id,
+        "created_at": time.time(),
+        "jobs": [
+            {"task_id": child.id, "source": name}
+            for child, (_, _, name) in zip(result.results, items)
+        ],
+    }
+    # Stored next to the task results, with the same expiry
+    celery_app.backend.set(f"{KEY_PREFIX}{result.id}", json.dumps(manifest))
+    return manifest
+
+def load_manifest(celery_app, batch_id: str):
+    raw = celery_app.backend.get(f"{KEY_PREFIX}{batch_id}")
+    return json.loads(raw) if raw else None
+
+def _job_status(celery_app, job: dict) -> dict:
+    task_result = celery_app.AsyncResult(job["task_id"])
+    state = task_result.state
+    status = {**job, "status": state, "progress": 0}
+    if state == "PROGRESS" and isinstance(task_result.info, dict):
+        status["progress"] = task_result.info.get("progress", 0)
+    elif state in FINISHED_STATES:
+        status["progress"] = 100
+        result = task_result.result
+        if state != "SUCCESS" or not isinstance(result, dict) or result.get("status") == "error":
+            # Pipeline errors are returned as results, not raised
+            status["status"] = "FAILURE"
+            status["error"] = result.get("error") if isinstance(result, dict) else str(result)
+        else:
+            status["filename"] = result.get("filename")
+            status["pdf_filename"] = result.get("pdf_filename")
+    return status
+
+def batch_status(celery_app, batch_id: str):
+    """
+    Aggregate progress of a batch, or None if the batch is unknown (or expired).
+    """
+    manifest = load_manifest(celery_app, batch_id)
+    if manifest is None:
+        return None
+
+    jobs = [_job_status(celery_app, job) for job in manifest["jobs"]]
+    finished = sum(1 for job in jobs if job["status"] in FINISHED_STATES)
+    failed = sum(1 for job in jobs if job["status"] == "FAILURE")
+    if finished == len(jobs):
+        status = "SUCCESS"
+    elif finished or any(job["status"] != "PENDING" for job in jobs):
+        status = "PROGRESS"
+    else:
+        status = "PENDING"
+
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "total": len(jobs),
+        "finished": finished,
+        "succeeded": finished - failed,
+        "failed": failed,
+        "progress": round(sum(job["progress"] for job in jobs) / len(jobs)) if jobs else 100,
+        "jobs": jobs,
+    }
+
+def build_batch_zip(status: dict) -> dict:
+    """
+    Packs the PPTX/PDF outputs of a finished batch into the artifact store as
+    batch_<id>.zip (built once, then reused). Returns its metadata. Blocking:
+    call it from a thread.
+    """
+    store = get_artifact_store()
+    zip_name = f"batch_{status['batch_id']}.zip"
+    meta = store.stat(zip_name)
+    if meta is not None:
+        return meta
+
+    fd, tmp_path = tempfile.mkstemp(prefix="batch-", suffix=".zip")
+    os.close(fd)
+    try:
+        # PPTX and PDF are already compressed, so store them as-is
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for index, job in enumerate(status["jobs"], 1):
+                stem = f"{index:02d}_{os.path.splitext(job['source'] or 'recording')[0]}"
+                for key, extension in (("filename", ".pptx"), ("pdf_filename", ".pdf")):
+                    if not job.get(key):
+                        continue
+                    try:
+                        with store.local_path(job[key]) as path:
+                            archive.write(path, arcname=f"{stem}{extension}")
+                    except FileNotFoundError:
+                        pass # Expired or evicted since the job finished
+        return store.put_file(tmp_path, zip_name, KIND_BATCH)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
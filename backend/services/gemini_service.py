@@ -1,6 +1,21 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
 import json
 import os
+import threading
 from config import Config
+from services.analysis_cache import AnalysisCache, get_analysis_cache, hash_audio_file
+from services.audio_service import (
+    preprocess_audio, estimate_upload_savings, probe_duration, segment_bounds, extract_segment,
+)
+from services.model_router import get_model_router, cached_list_models
+from services.presentation_schema import PresentationData, SegmentSummary, gemini_schema
+from utils.counters import incr
+from utils.metrics import span, STAGE_GEMINI_UPLOAD, STAGE_MODEL_CALL
+from utils.json_stream import SlideStreamParser
+from pydantic import ValidationError
 import time
 
 # Safe import for Gemini
@@ -17,49 +32,11 @@ if HAS_GEMINI and Config.GOOGLE_API_KEY:
     except Exception as e:
         print(f"Error configuring Gemini: {e}")
 
-def analyze_audio(audio_path: str) -> dict:
-    """
-    Uploads audio to Gemini and extracts structured presentation data.
-    """
-    if not HAS_GEMINI:
-        return {
-            "title": "System Error",
-            "slides": [{"title": "Gemini Library Missing", "bullet_points": ["The AI library failed to load."], "speaker_notes": "Check server logs."}]
-        }
+# Bump whenever ANALYSIS_PROMPT or the response format changes so cached analyses
+# from the old one are not reused (2: schema-validated structured output)
+PROMPT_VERSION = "2"
 
-    # List of models to try in order of preference
-    # Updated based on user preference (2.5 worked best)
-    models_to_try = [
-        'gemini-2.5-flash',
-        'gemini-2.0-flash',
-        'gemini-flash-latest'
-    ]
-    
-    last_error = None
-    
-    # Upload the file ONCE (it can be reused across model calls usually, but let's re-upload to be safe or just upload once)
-    # Actually, upload_file returns a file object that is tied to the account.
-    try:
-        print(f"Uploading audio file: {audio_path}")
-        audio_file = genai.upload_file(path=audio_path)
-        print(f"Audio uploaded: {audio_file.name}")
-        
-        # Wait for file to be active
-        while audio_file.state.name == "PROCESSING":
-            print("⏳ Waiting for audio file to process...")
-            time.sleep(2)
-            audio_file = genai.get_file(audio_file.name)
-            
-        if audio_file.state.name == "FAILED":
-             raise Exception("Audio file processing failed by Google")
-             
-    except Exception as upload_err:
-        return {
-            "title": "Upload Error",
-            "slides": [{"title": "Audio Upload Failed", "bullet_points": [str(upload_err)], "speaker_notes": "Check API Key and Internet."}]
-        }
-
-    prompt = """
+ANALYSIS_PROMPT = """
     # ROL
     Actúa como un Senior Product Marketing Manager y Director de Arte experto en presentaciones B2B de alto impacto (estilo McKinsey/Apple).
 
@@ -102,51 +79,173 @@ def analyze_audio(audio_path: str) -> dict:
     }
     """
 
-    for model_name in models_to_try:
+# Map step for long recordings: one call per overlapping audio segment
+SEGMENT_PROMPT = """
+    # ROL
+    Eres analista de contenido. Recibirás un SEGMENTO ({start}-{end}) de una grabación más larga;
+    los segmentos se solapan unos segundos con el anterior y el siguiente.
+
+    # TAREA
+    Resume SOLO lo que se dice en este segmento, sin inventar contexto.
+
+    # FORMATO DE SALIDA (JSON OBLIGATORIO)
+    Devuelve SOLO un JSON válido con esta estructura:
+    {{
+        "topics": ["Tema tratado"],
+        "key_points": ["Idea o argumento clave"],
+        "data_points": ["Cifra, dato o ejemplo concreto mencionado"],
+        "objective_hints": "Pistas sobre el OBJETIVO y la AUDIENCIA, si las hay",
+        "tone": "Tono del discurso"
+    }}
+    """
+
+# Reduce step: the segment summaries replace the audio, the deck rules and schema are the same
+REDUCE_PROMPT = """
+    # ROL
+    Actúa como un Senior Product Marketing Manager y Director de Arte experto en presentaciones B2B de alto impacto (estilo McKinsey/Apple).
+
+    # INPUT
+    Recibirás en JSON los resúmenes de segmentos consecutivos (y solapados) de una misma grabación.
+    Elimina repeticiones causadas por el solapamiento. "missing_segments" lista tramos que no se pudieron analizar.
+    A partir de ellos extrae TEMA, OBJETIVO y AUDIENCIA como si hubieras escuchado el audio completo.
+
+    """ + ANALYSIS_PROMPT[ANALYSIS_PROMPT.index("# TAREA"):]
+
+# Text-only fix-up for a response that is not valid JSON for its schema
+REPAIR_PROMPT = """
+    El siguiente texto debía ser un JSON válido según el esquema de respuesta, pero no se pudo usar ({error}).
+    Devuelve SOLO el JSON corregido: conserva todo el contenido, corrige la sintaxis, completa los campos
+    obligatorios que falten y elimina cualquier texto fuera del objeto.
+    """
+
+# List of models to try in order of preference
+# Updated based on user preference (2.5 worked best)
+MODELS_TO_TRY = [
+    'gemini-2.5-flash',
+    'gemini-2.0-flash',
+    'gemini-flash-latest'
+]
+
+def _parse_response_text(text: str) -> dict:
+    """Strips markdown fences from a model response and parses the JSON. Raises JSONDecodeError."""
+    if text.startswith("```json"):
+        text = text[7:]
+    elif text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text.strip())
+
+async def _upload_audio_async(audio_path: str):
+    """
+    Uploads the audio and waits until Google has processed it, polling with an
+    interval that starts short and backs off for long files.
+    """
+    print(f"Uploading audio file: {audio_path}")
+    with span(STAGE_GEMINI_UPLOAD):
+        audio_file = await asyncio.to_thread(genai.upload_file, path=audio_path)
+        print(f"Audio uploaded: {audio_file.name}")
+
+        interval = Config.GEMINI_FILE_POLL_MIN
+        while audio_file.state.name == "PROCESSING":
+            print(f"⏳ Waiting {interval:.1f}s for audio file to process...")
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, Config.GEMINI_FILE_POLL_MAX)
+            audio_file = await asyncio.to_thread(genai.get_file, audio_file.name)
+
+    if audio_file.state.name == "FAILED":
+        await _delete_uploaded_async(audio_file)
+        raise Exception("Audio file processing failed by Google")
+    return audio_file
+
+async def _delete_uploaded_async(audio_file):
+    """Deletes an uploaded file so uploads do not pile up against the Files API quota."""
+    try:
+        await asyncio.to_thread(genai.delete_file, audio_file.name)
+        print(f"🧹 Deleted uploaded file {audio_file.name}")
+    except Exception as e:
+        print(f"⚠️ Could not delete uploaded file {audio_file.name}: {e}")
+
+async def analyze_audio_async(audio_path: str, audio_sha256: str = None, stats: dict = None) -> dict:
+    """
+    Uploads audio to Gemini and extracts structured presentation data.
+
+    If stats is given it receives the audio pre-processing report (bytes and
+    upload time saved) when the audio had to be uploaded.
+
+    Blocking SDK calls run in threads and all waits are awaited, so many
+    analyses can share the process's event loop (see _get_event_loop).
+    """
+    if not HAS_GEMINI:
+        return {
+            "title": "System Error",
+            "slides": [{"title": "Gemini Library Missing", "bullet_points": ["The AI library failed to load."], "speaker_notes": "Check server logs."}]
+        }
+
+    models_to_try = MODELS_TO_TRY
+
+    # Identical audio (forwarded voice notes, retried uploads) skips Gemini entirely
+    cache = get_analysis_cache() if Config.ANALYSIS_CACHE_ENABLED else None
+    if cache is not None:
         try:
-            print(f"🔄 Trying Gemini Model: {model_name}...")
-            model = genai.GenerativeModel(model_name)
-            
-            response = model.generate_content([prompt, audio_file])
-            
-            # If we get here, it worked! Process response
-            text = response.text
-            if text.startswith("```json"):
-                text = text[7:]
-            elif text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-                
+            audio_sha256 = audio_sha256 or await asyncio.to_thread(hash_audio_file, audio_path)
+            cached = await asyncio.to_thread(cache.lookup, [
+                AnalysisCache.make_key(audio_sha256, PROMPT_VERSION, m) for m in models_to_try
+            ])
+            if cached is not None:
+                print(f"♻️ Analysis cache hit for audio {audio_sha256[:12]}")
+                return cached
+        except Exception as cache_err:
+            print(f"⚠️ Analysis cache lookup failed: {cache_err}")
+            cache = None
+
+    # Shrink the recording first (mono, speech sample rate, silence trimmed);
+    # cache keys stay on the original audio hash
+    upload_path, audio_report = await asyncio.to_thread(preprocess_audio, audio_path)
+    try:
+        duration = None
+        if Config.AUDIO_CHUNK_THRESHOLD > 0:
+            duration = await asyncio.to_thread(probe_duration, upload_path)
+
+        if duration and duration > Config.AUDIO_CHUNK_THRESHOLD:
+            outcome = await _analyze_segmented(upload_path, duration, audio_report)
+        else:
+            # Upload the file ONCE and reuse it across model calls
             try:
-                result = json.loads(text.strip())
-                print(f"✅ Success with model: {model_name}")
-                return result
-            except json.JSONDecodeError:
-                print(f"❌ Failed to decode JSON from {model_name}")
-                last_error = f"JSON Decode Error with {model_name}"
-                continue # Try next model if JSON fails (unlikely but possible)
+                upload_started = time.monotonic()
+                audio_file = await _upload_audio_async(upload_path)
+                estimate_upload_savings(audio_report, time.monotonic() - upload_started)
+            except Exception as upload_err:
+                return {
+                    "title": "Upload Error",
+                    "slides": [{"title": "Audio Upload Failed", "bullet_points": [str(upload_err)], "speaker_notes": "Check API Key and Internet."}]
+                }
+            try:
+                outcome = await _generate_json(
+                    [ANALYSIS_PROMPT, audio_file], PresentationData, on_slide=_image_prefetcher()
+                )
+            finally:
+                await _delete_uploaded_async(audio_file)
+        if stats is not None:
+            stats["audio"] = audio_report
+    finally:
+        if upload_path != audio_path:
+            os.remove(upload_path)
 
-        except Exception as e:
-            print(f"⚠️ Model {model_name} failed: {e}")
-            last_error = str(e)
-            
-            # Smart Retry for Rate Limits
-            if "429" in str(e) or "quota" in str(e).lower():
-                 print(f"⏳ Rate Limit Hit on {model_name}. Waiting 15 seconds before next model...")
-                 time.sleep(15)
-            else:
-                 time.sleep(2)
-            
-            continue
+    result, model_name, last_error, tried_models = outcome
+    if result is not None:
+        if cache is not None:
+            try:
+                key = AnalysisCache.make_key(audio_sha256, PROMPT_VERSION, model_name)
+                await asyncio.to_thread(cache.put, key, result)
+            except Exception as cache_err:
+                print(f"⚠️ Analysis cache write failed: {cache_err}")
+        return result
 
     # If all models failed, try to list available models for debugging
     available_models_info = "Could not list models."
     try:
-        available = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                available.append(m.name)
+        available = await asyncio.to_thread(cached_list_models, genai.list_models)
         available_models_info = "Available: " + ", ".join(available)
     except Exception as list_err:
         available_models_info = f"List models failed: {list_err}"
@@ -158,10 +257,268 @@ def analyze_audio(audio_path: str) -> dict:
                 "title": "All AI Models Failed",
                 "bullet_points": [
                     f"Last error: {last_error}", 
-                    f"Tried: {', '.join(models_to_try)}",
+                    f"Tried: {', '.join(tried_models) or 'none (no capacity)'}",
                     f"Debug info: {available_models_info}"
                 ],
                 "speaker_notes": "Check server logs for details."
             }
         ]
     }
+
+async def _stream_text(model, contents: list, on_slide) -> str:
+    """Streams a response, calling on_slide(slide) as each slides[i] object completes. Returns the full text."""
+    parser = SlideStreamParser()
+    response = await model.generate_content_async(contents, stream=True)
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            continue # Chunk without text parts (e.g. only a finish reason)
+        for slide in parser.feed(text):
+            try:
+                on_slide(slide)
+            except Exception as e:
+                print(f"⚠️ Early slide handler failed: {e}")
+    print(f"📡 Streamed {parser.slides_seen} slides")
+    return parser.text
+
+def _image_prefetcher():
+    """
+    on_slide callback that starts each slide's image download as soon as the slide
+    is parsed, so the render stage finds it in the shared image cache.
+    """
+    if not Config.IMAGE_CACHE_ENABLED or Config.PLUSAI_API_KEY:
+        # Plus AI builds the deck with its own images
+        return None
+    from services.pptx_service import prefetch_images
+    return lambda slide: prefetch_images([slide])
+
+@functools.lru_cache(maxsize=None)
+def _generation_config(schema):
+    """Structured output: JSON only, constrained to the schema of the pydantic model."""
+    if not Config.GEMINI_STRUCTURED_OUTPUT:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": gemini_schema(schema)}
+
+def _get_model(model_name: str, schema):
+    """This process's GenerativeModel handle for (model_name, schema), built once."""
+    key = (model_name, schema)
+    model = _models.get(key)
+    if model is None:
+        model = _models[key] = genai.GenerativeModel(model_name, generation_config=_generation_config(schema))
+    return model
+
+def _validate(text: str, schema) -> dict:
+    """Parses and validates a response; raises json.JSONDecodeError or pydantic.ValidationError."""
+    return schema.model_validate(_parse_response_text(text)).model_dump()
+
+async def _repair_json(text: str, schema, error: Exception):
+    """
+    Text-only call that fixes a malformed or partial response, instead of sending
+    the audio to another model. Returns the validated result or None.
+    """
+    prompt = REPAIR_PROMPT.format(error=str(error)[:500])
+    result, model_name, _, _ = await _generate_json([prompt, text], schema, allow_repair=False)
+    if result is not None:
+        print(f"🩹 Repaired invalid JSON with {model_name}")
+    return result
+
+async def _generate_json(contents: list, schema, on_slide=None, allow_repair: bool = True):
+    """
+    Runs one Gemini request through the shared model router, falling back across
+    models. The response must validate against schema (a pydantic model).
+    Returns (result, model_name, last_error, tried_models); result is None when
+    every model failed.
+
+    Invalid output is first repaired with a cheap text-only call; only if that
+    fails is the request retried on the next model.
+
+    With on_slide and GEMINI_STREAMING the response is streamed and on_slide is
+    called for every slide object while the model is still generating.
+    """
+    # The shared router picks the fastest model with capacity; 429s put a model in
+    # cooldown for every worker instead of each task sleeping on its own.
+    router = get_model_router()
+    failed_models = set()
+    tried_models = []
+    last_error = None
+    deadline = time.monotonic() + Config.GEMINI_MAX_WAIT
+    while True:
+        model_name, wait = await asyncio.to_thread(router.acquire, failed_models)
+        if model_name is None:
+            if wait is None or time.monotonic() + wait > deadline:
+                return None, None, last_error, tried_models
+            print(f"⏳ No Gemini model has capacity, waiting {wait:.1f}s...")
+            await asyncio.sleep(wait)
+            continue
+
+        if tried_models and model_name != tried_models[-1]:
+            incr("gemini.fallbacks") # Not for the same model retried after its cooldown
+        tried_models.append(model_name)
+        try:
+            print(f"🔄 Trying Gemini Model: {model_name}...")
+            model = _get_model(model_name, schema)
+
+            started = time.monotonic()
+            with span(STAGE_MODEL_CALL, model=model_name):
+                if on_slide is not None and Config.GEMINI_STREAMING:
+                    text = await _stream_text(model, contents, on_slide)
+                else:
+                    text = (await model.generate_content_async(contents)).text
+            await asyncio.to_thread(router.record_success, model_name, time.monotonic() - started)
+
+            # If we get here, it worked! Process response
+            try:
+                result = _validate(text, schema)
+                print(f"✅ Success with model: {model_name}")
+                return result, model_name, None, tried_models
+            except (json.JSONDecodeError, ValidationError) as parse_err:
+                print(f"❌ Invalid JSON from {model_name}: {str(parse_err)[:200]}")
+                last_error = f"Invalid JSON from {model_name}"
+                invalid_error = parse_err
+                if not allow_repair:
+                    # A repair gets one shot; the caller falls back to a full retry
+                    return None, model_name, last_error, tried_models
+
+            repaired = await _repair_json(text, schema, invalid_error)
+            if repaired is not None:
+                incr("gemini.json_repairs")
+                return repaired, model_name, None, tried_models
+            # Repair failed too: fall back to re-running the full request on the next model
+            incr("gemini.json_full_retries")
+            failed_models.add(model_name)
+            continue
+
+        except Exception as e:
+            print(f"⚠️ Model {model_name} failed: {e}")
+            last_error = str(e)
+
+            if "429" in str(e) or "quota" in str(e).lower():
+                await asyncio.to_thread(router.record_rate_limit, model_name)
+            else:
+                failed_models.add(model_name)
+            continue
+
+def _clock(seconds: float) -> str:
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+async def _analyze_segment(audio_path: str, index: int, start: float, end: float, upload_times: list):
+    """
+    Map step for one segment: cut, upload and summarize it, retrying just this
+    segment up to GEMINI_SEGMENT_RETRIES times. Returns the summary or None.
+    """
+    prompt = SEGMENT_PROMPT.format(start=_clock(start), end=_clock(end))
+    for attempt in range(Config.GEMINI_SEGMENT_RETRIES + 1):
+        segment_path = None
+        audio_file = None
+        try:
+            segment_path = await asyncio.to_thread(extract_segment, audio_path, start, end)
+            upload_started = time.monotonic()
+            audio_file = await _upload_audio_async(segment_path)
+            upload_times.append(time.monotonic() - upload_started)
+            summary, _, last_error, _ = await _generate_json([prompt, audio_file], SegmentSummary)
+            if summary is not None:
+                return {**summary, "segment": index + 1, "start": _clock(start), "end": _clock(end)}
+        except Exception as e:
+            last_error = str(e)
+        finally:
+            if audio_file is not None:
+                await _delete_uploaded_async(audio_file)
+            if segment_path is not None:
+                os.remove(segment_path)
+        incr("gemini.segment_retries")
+        print(f"⚠️ Segment {index + 1} ({_clock(start)}-{_clock(end)}) failed (attempt {attempt + 1}): {last_error}")
+    return None
+
+async def _analyze_segmented(audio_path: str, duration: float, audio_report: dict):
+    """
+    Map-reduce analysis for long recordings: overlapping segments are summarized
+    in parallel, then one text-only call turns the summaries into the deck JSON.
+    Returns the same tuple as _generate_json.
+    """
+    bounds = segment_bounds(duration, Config.AUDIO_SEGMENT_SECONDS, Config.AUDIO_SEGMENT_OVERLAP)
+    print(f"✂️ Long recording ({_clock(duration)}), analyzing {len(bounds)} overlapping segments")
+    semaphore = asyncio.Semaphore(Config.GEMINI_MAX_CONCURRENCY)
+    upload_times = []
+
+    async def _one(index, start, end):
+        async with semaphore:
+            return await _analyze_segment(audio_path, index, start, end, upload_times)
+
+    summaries = await asyncio.gather(*(_one(i, start, end) for i, (start, end) in enumerate(bounds)))
+    estimate_upload_savings(audio_report, sum(upload_times))
+
+    completed = [s for s in summaries if s is not None]
+    if not completed:
+        return None, None, "Every audio segment failed", []
+    missing = [f"{_clock(start)}-{_clock(end)}" for s, (start, end) in zip(summaries, bounds) if s is None]
+    if missing:
+        print(f"⚠️ Reducing without segments {', '.join(missing)}")
+
+    reduce_input = json.dumps({"segments": completed, "missing_segments": missing}, ensure_ascii=False)
+    return await _generate_json([REDUCE_PROMPT, reduce_input], PresentationData, on_slide=_image_prefetcher())
+
+# One event loop per process, running on its own thread. The SDK's default async
+# client is a grpc.aio channel bound to the loop that first used it, so every
+# analysis in the process runs here instead of in a fresh asyncio.run().
+_loop = None
+_loop_thread = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_LOOP_IO_THREADS = 64 # asyncio.to_thread pool shared by every analysis on the loop
+
+# GenerativeModel handles per (model, schema), reused across attempts and tasks
+_models = {}
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns this process's analysis loop, starting a new one if there is none, after a fork, or if its thread died."""
+    global _loop, _loop_thread, _loop_pid
+    pid = os.getpid()
+    with _loop_lock:
+        if _loop is None or _loop_pid != pid or not _loop_thread.is_alive():
+            if _loop is not None and HAS_GEMINI and Config.GOOGLE_API_KEY:
+                # Drops the SDK clients bound to the old loop
+                genai.configure(api_key=Config.GOOGLE_API_KEY)
+            _models.clear()
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(
+                concurrent.futures.ThreadPoolExecutor(max_workers=_LOOP_IO_THREADS, thread_name_prefix="gemini-io")
+            )
+            thread = threading.Thread(target=loop.run_forever, name="gemini-loop", daemon=True)
+            thread.start()
+            _loop, _loop_thread, _loop_pid = loop, thread, pid
+    return _loop
+
+def _run_on_loop(coro):
+    """Runs coro on the process's loop and waits for it, in a copy of the caller's context (job spans)."""
+    loop = _get_event_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def _finish(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def _start():
+        loop.create_task(coro, context=context).add_done_callback(_finish)
+
+    loop.call_soon_threadsafe(_start)
+    return future.result()
+
+def warm_up():
+    """Starts the analysis loop and builds the model handles, e.g. when a worker process starts."""
+    _get_event_loop()
+    if HAS_GEMINI:
+        for model_name in MODELS_TO_TRY:
+            _get_model(model_name, PresentationData)
+
+def analyze_audio(audio_path: str, audio_sha256: str = None, stats: dict = None) -> dict:
+    """
+    Uploads audio to Gemini and extracts structured presentation data (blocking
+    wrapper). Concurrent callers, e.g. a threads-pool worker, share one loop.
+    """
+    return _run_on_loop(analyze_audio_async(audio_path, audio_sha256, stats))
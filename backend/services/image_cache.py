@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from config import Config
+from utils.counters import incr, get_counters
+from utils.redis_client import get_redis
+
+# Redis index: sorted set of cache keys scored by last access time, plus their sizes.
+# Workers sharing the cache volume use it to agree on what to evict.
+INDEX_KEY = "image_cache:lru"
+SIZES_KEY = "image_cache:sizes"
+TOTAL_KEY = "image_cache:bytes"
+
+# Records one put and pops least recently used keys until the total fits, in one
+# atomic step so concurrent workers neither over-evict nor overshoot the limit.
+# Returns the evicted keys; the caller deletes their files.
+_PUT_AND_EVICT_LUA = """
+local key, size, now, max_bytes = ARGV[1], tonumber(ARGV[2]), ARGV[3], tonumber(ARGV[4])
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    local total = 0
+    for _, value in ipairs(redis.call('HVALS', KEYS[2])) do
+        total = total + tonumber(value)
+    end
+    redis.call('SET', KEYS[3], total)
+end
+local previous = tonumber(redis.call('HGET', KEYS[2], key) or 0)
+redis.call('ZADD', KEYS[1], now, key)
+redis.call('HSET', KEYS[2], key, size)
+local total = redis.call('INCRBY', KEYS[3], size - previous)
+local evicted = {}
+while total > max_bytes do
+    local oldest = redis.call('ZPOPMIN', KEYS[1], 1)
+    if #oldest == 0 then
+        break
+    end
+    local victim = oldest[1]
+    local victim_size = tonumber(redis.call('HGET', KEYS[2], victim) or 0)
+    redis.call('HDEL', KEYS[2], victim)
+    total = redis.call('DECRBY', KEYS[3], victim_size)
+    table.insert(evicted, victim)
+end
+return evicted
+"""
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache for rendered slide images with a size-based LRU limit.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, use_redis: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_redis = use_redis
+        self._lock = threading.Lock()
+        self._local_bytes = None # Lazily computed when Redis is not used
+        self._script = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(query: str, width: int, height: int, seed: int) -> str:
+        raw = f"{query}\x00{width}\x00{height}\x00{seed}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.img")
+
+    def _redis(self):
+        return get_redis() if self.use_redis else None
+
+    def exists(self, key: str) -> bool:
+        """Whether key is cached, without counting a hit or miss or touching its recency."""
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str):
+        """Returns the cached bytes for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            incr("image_cache.misses")
+            return None
+
+        # Refresh recency for LRU eviction
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        r = self._redis()
+        if r is not None:
+            try:
+                r.zadd(INDEX_KEY, {key: now})
+            except Exception as e:
+                print(f"⚠️ Image cache index update failed: {e}")
+
+        incr("image_cache.hits")
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Stores bytes under key and evicts least recently used entries past the size limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path) # Overwrites replace an entry, they do not add one
+        except FileNotFoundError:
+            previous = 0
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path) # Atomic, so concurrent readers never see partial files
+
+        r = self._redis()
+        if r is not None:
+            try:
+                self._evict_redis(r, key, len(data))
+                return
+            except Exception as e:
+                print(f"⚠️ Image cache index write failed, evicting locally: {e}")
+
+        with self._lock:
+            if self._local_bytes is None:
+                self._local_bytes = sum(size for _, _, size in self._scan())
+            else:
+                self._local_bytes += len(data) - previous
+            if self._local_bytes > self.max_bytes:
+                self._evict_local()
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".img"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        return entries
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict_local(self):
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            incr("image_cache.evictions")
+        self._local_bytes = total
+
+    def _evict_redis(self, r, key: str, size: int):
+        """Indexes a put and evicts what no longer fits, atomically across workers."""
+        if self._script is None:
+            self._script = r.register_script(_PUT_AND_EVICT_LUA)
+        evicted = self._script(
+            keys=[INDEX_KEY, SIZES_KEY, TOTAL_KEY], args=[key, size, time.time(), self.max_bytes], client=r
+        )
+        for victim in evicted:
+            self._remove(victim.decode() if isinstance(victim, bytes) else victim)
+        if evicted:
+            incr("image_cache.evictions", len(evicted))
+
+    def stats(self) -> dict:
+        counters = get_counters("image_cache.")
+        hits = counters.get("image_cache.hits", 0)
+        misses = counters.get("image_cache.misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("image_cache.evictions", 0),
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+_cache = None
+
+def get_image_cache() -> ImageCache:
+    """Returns the process-wide image cache configured from Config."""
+    global _cache
+    if _cache is None:
+        _cache = ImageCache(
+            Config.IMAGE_CACHE_DIR,
+            Config.IMAGE_CACHE_MAX_BYTES,
+            use_redis=Config.IMAGE_CACHE_USE_REDIS,
+        )
+    return _cache
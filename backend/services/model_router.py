@@ -0,0 +1,188 @@
+import json
+import threading
+import time
+from config import Config
+from utils.counters import incr
+from utils.redis_client import get_redis
+
+KEY_PREFIX = "model_router:"
+AVAILABLE_MODELS_KEY = "model_router:available_models"
+
+# Weight of the newest sample in the latency moving average
+LATENCY_ALPHA = 0.3
+
+# Atomically refills a model's token bucket and takes one token.
+# Returns {1, "0"} on success or {0, seconds_until_capacity}.
+_TAKE_TOKEN_LUA = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'cooldown_until')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+local cooldown_until = tonumber(state[3]) or 0
+if cooldown_until > now then
+    return {0, tostring(cooldown_until - now)}
+end
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+if tokens >= 1 then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated_at', tostring(now))
+    return {1, '0'}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+return {0, tostring((1 - tokens) / rate)}
+"""
+
+class ModelRouter:
+    """
+    Picks the Gemini model for each request from state shared by all workers.
+
+    Every model has a token bucket sized to its requests-per-minute budget, a
+    cooldown that starts when it returns 429, and a moving average of recent
+    latency. acquire() returns the fastest model that has capacity right now,
+    or how long to wait until one will.
+    """
+
+    def __init__(self, models: list, rpm: int, cooldown: float):
+        self.models = list(models)
+        self.capacity = max(1, rpm)
+        self.rate = self.capacity / 60.0
+        self.cooldown = cooldown
+        self._script = None
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _key(self, model: str) -> str:
+        return f"{KEY_PREFIX}{model}"
+
+    def _state(self, r, model: str) -> dict:
+        if r is not None:
+            raw = r.hgetall(self._key(model))
+            return {k.decode(): float(v) for k, v in raw.items()}
+        with self._lock:
+            return dict(self._local.get(model, {}))
+
+    def _rank(self, r, candidates: list) -> list:
+        """Known-fast models first; models without samples keep preference order after them."""
+        def sort_key(indexed):
+            index, model = indexed
+            latency = self._state(r, model).get("latency")
+            return (latency is None, latency or 0.0, index)
+        return [m for _, m in sorted(enumerate(candidates), key=sort_key)]
+
+    def _take_token(self, r, model: str, now: float):
+        if r is not None:
+            if self._script is None:
+                self._script = r.register_script(_TAKE_TOKEN_LUA)
+            ok, wait = self._script(keys=[self._key(model)], args=[now, self.capacity, self.rate])
+            return bool(int(ok)), float(wait)
+
+        with self._lock:
+            state = self._local.setdefault(model, {})
+            if state.get("cooldown_until", 0) > now:
+                return False, state["cooldown_until"] - now
+            tokens = min(
+                self.capacity,
+                state.get("tokens", self.capacity) + (now - state.get("updated_at", now)) * self.rate,
+            )
+            state["updated_at"] = now
+            if tokens >= 1:
+                state["tokens"] = tokens - 1
+                return True, 0.0
+            state["tokens"] = tokens
+            return False, (1 - tokens) / self.rate
+
+    def acquire(self, exclude=()):
+        """
+        Returns (model, 0) for the fastest model with capacity, or (None, seconds_to_wait).
+        Returns (None, None) when every model is excluded.
+        """
+        candidates = [m for m in self.models if m not in exclude]
+        if not candidates:
+            return None, None
+
+        try:
+            return self._acquire(self._redis(), candidates)
+        except Exception as e:
+            print(f"⚠️ Model router unavailable in Redis, using local state: {e}")
+            return self._acquire(None, candidates)
+
+    def _acquire(self, r, candidates: list):
+        now = time.time()
+        shortest_wait = None
+        for model in self._rank(r, candidates):
+            ok, wait = self._take_token(r, model, now)
+            if ok:
+                return model, 0.0
+            shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+        return None, shortest_wait
+
+    def _redis(self):
+        r = get_redis()
+        if r is None:
+            self._script = None
+        return r
+
+    def _update(self, model: str, **fields):
+        r = self._redis()
+        if r is not None:
+            try:
+                r.hset(self._key(model), mapping={k: str(v) for k, v in fields.items()})
+                return
+            except Exception as e:
+                print(f"⚠️ Model router state not saved: {e}")
+        with self._lock:
+            self._local.setdefault(model, {}).update(fields)
+
+    def record_success(self, model: str, latency: float):
+        try:
+            previous = self._state(self._redis(), model).get("latency")
+        except Exception:
+            previous = None
+        smoothed = latency if previous is None else LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * previous
+        self._update(model, latency=smoothed)
+
+    def record_rate_limit(self, model: str):
+        """Puts the model in cooldown for every worker and empties its bucket."""
+        print(f"🧊 {model} rate limited, cooling down for {self.cooldown:.0f}s")
+        incr("gemini.rate_limited")
+        self._update(model, tokens=0, cooldown_until=time.time() + self.cooldown, updated_at=time.time())
+
+_router = None
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide router configured from Config."""
+    global _router
+    if _router is None:
+        from services.gemini_service import MODELS_TO_TRY
+        _router = ModelRouter(MODELS_TO_TRY, Config.GEMINI_MODEL_RPM, Config.GEMINI_RATE_LIMIT_COOLDOWN)
+    return _router
+
+_available_models = None
+_available_models_at = 0.0
+
+def cached_list_models(list_models) -> list:
+    """
+    Names of models that support generateContent, cached in Redis (or in-process) for
+    GEMINI_LIST_MODELS_TTL instead of calling list_models on every failure.
+    """
+    global _available_models, _available_models_at
+    r = get_redis()
+    if r is not None:
+        try:
+            raw = r.get(AVAILABLE_MODELS_KEY)
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            print(f"⚠️ Could not read cached model list: {e}")
+    elif _available_models is not None and time.time() - _available_models_at < Config.GEMINI_LIST_MODELS_TTL:
+        return _available_models
+
+    available = [m.name for m in list_models() if 'generateContent' in m.supported_generation_methods]
+    _available_models, _available_models_at = available, time.time()
+    if r is not None:
+        try:
+            r.setex(AVAILABLE_MODELS_KEY, int(Config.GEMINI_LIST_MODELS_TTL), json.dumps(available))
+        except Exception as e:
+            print(f"⚠️ Could not cache model list: {e}")
+    return available
@@ -0,0 +1,364 @@
+import atexit
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import Config
+
+# Safe import for the UNO bridge. Debian's python3-uno installs into the system
+# dist-packages, which the image's own interpreter does not search by default.
+# It is built for Debian's python3, so the image pins a base whose system Python
+# matches (see the Dockerfile); a mismatch shows up here as an import error.
+UNO_IMPORT_ERROR = None
+try:
+    import uno
+    HAS_UNO = True
+except ImportError:
+    sys.path.append("/usr/lib/python3/dist-packages")
+    try:
+        import uno
+        HAS_UNO = True
+    except ImportError as e:
+        UNO_IMPORT_ERROR = str(e)
+        HAS_UNO = False
+        print(
+            f"❌ UNO bridge unusable ({e}). PDF conversion falls back to one soffice process per job, "
+            "which is much slower; install a python3-uno built for this interpreter."
+        )
+
+if HAS_UNO:
+    import unohelper
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+    from com.sun.star.io import XOutputStream
+
+    class _BytesOutputStream(unohelper.Base, XOutputStream):
+        """Collects what LibreOffice writes to a 'private:stream' target."""
+
+        def __init__(self):
+            self.chunks = []
+
+        def writeBytes(self, data):
+            self.chunks.append(data.value)
+
+        def flush(self):
+            pass
+
+        def closeOutput(self):
+            pass
+
+        def getvalue(self) -> bytes:
+            return b"".join(self.chunks)
+
+def _props(**kwargs):
+    values = []
+    for name, value in kwargs.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        values.append(prop)
+    return tuple(values)
+
+class ConversionError(Exception):
+    pass
+
+def _process_tree(pid: int) -> list:
+    """pid and its descendants, from /proc (soffice runs soffice.bin as a child)."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return pids
+
+def _rss_mb(pids: list) -> float:
+    """Resident memory of pids in MB, or None when /proc is not available."""
+    total_kb = None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb = (total_kb or 0) + int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return None if total_kb is None else total_kb / 1024
+
+class LibreOfficeServer:
+    """
+    A long-lived headless LibreOffice instance reached over a UNO pipe.
+
+    Each instance owns its user profile, so several servers (one per worker
+    process) can convert in parallel. Jobs are queued on a single thread
+    because one office instance only converts one document at a time.
+    """
+
+    def __init__(self, name: str, profile_dir: str):
+        self.name = name
+        self.profile_dir = profile_dir
+        self._process = None
+        self._ctx = None
+        self._desktop = None
+        self._jobs = 0
+        self._queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"lo-{name}")
+        self._lock = threading.Lock()
+
+    @property
+    def accept_string(self) -> str:
+        return f"pipe,name={self.name};urp;"
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def memory_mb(self) -> float:
+        """Resident memory of the office process tree, or None if it is not running."""
+        if not self.is_alive():
+            return None
+        return _rss_mb(_process_tree(self._process.pid))
+
+    def _recycle_reason(self) -> str:
+        """Why a running server should be replaced before its next job, or None."""
+        if Config.LIBREOFFICE_MAX_JOBS and self._jobs >= Config.LIBREOFFICE_MAX_JOBS:
+            return f"{self._jobs} conversions"
+        if Config.LIBREOFFICE_MAX_MEMORY_MB:
+            memory = self.memory_mb()
+            if memory is not None and memory > Config.LIBREOFFICE_MAX_MEMORY_MB:
+                return f"{memory:.0f} MB resident"
+        return None
+
+    def _ensure_ready(self):
+        """Health check before each job: restarts a crashed server and recycles a worn-out one."""
+        if self.is_alive() and self._desktop is not None:
+            reason = self._recycle_reason()
+            if reason is None:
+                self._jobs += 1
+                return
+            print(f"♻️ Recycling LibreOffice server {self.name} after {reason}")
+            self.stop()
+        self.start()
+        self._jobs += 1
+
+    def start(self):
+        """Launches soffice, connects to it and warms it up. Safe to call when already running."""
+        with self._lock:
+            if self.is_alive() and self._desktop is not None:
+                return
+            self._stop_locked()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            cmd = [
+                Config.LIBREOFFICE_BIN,
+                "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+                f"-env:UserInstallation=file://{self.profile_dir}",
+                f"--accept={self.accept_string}",
+            ]
+            print(f"🚀 Starting LibreOffice server {self.name}")
+            self._process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self._desktop = self._connect()
+            self._jobs = 0
+            print(f"✅ LibreOffice server {self.name} ready (pid {self._process.pid})")
+
+    def _connect(self):
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_ctx
+        )
+        deadline = time.monotonic() + Config.LIBREOFFICE_STARTUP_TIMEOUT
+        while True:
+            if not self.is_alive():
+                raise ConversionError("LibreOffice exited during startup")
+            try:
+                self._ctx = resolver.resolve(f"uno:{self.accept_string}StarOffice.ComponentContext")
+                return self._ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", self._ctx)
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    raise ConversionError("Timed out waiting for LibreOffice to accept connections")
+                time.sleep(0.25)
+
+    def stop(self):
+        with self._lock:
+            self._stop_locked()
+
+    def _stop_locked(self):
+        self._desktop = None
+        self._ctx = None
+        if self._process is not None:
+            if self._process.poll() is None:
+                # Collect the children first so soffice.bin does not outlive its launcher
+                children = _process_tree(self._process.pid)[1:]
+                self._process.kill()
+                for pid in children:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                try:
+                    self._process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._process = None
+
+    def _convert_now(self, pptx_path: str, pdf_path: str) -> str:
+        self._ensure_ready()
+        doc = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(pptx_path)), "_blank", 0, _props(Hidden=True)
+        )
+        if doc is None:
+            raise ConversionError(f"LibreOffice could not open {pptx_path}")
+        try:
+            doc.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                _props(FilterName="impress_pdf_Export"),
+            )
+        finally:
+            doc.close(True)
+        return pdf_path
+
+    def _convert_bytes_now(self, pptx_bytes: bytes) -> bytes:
+        self._ensure_ready()
+        input_stream = self._ctx.ServiceManager.createInstanceWithArgumentsAndContext(
+            "com.sun.star.io.SequenceInputStream", (uno.ByteSequence(pptx_bytes),), self._ctx
+        )
+        doc = self._desktop.loadComponentFromURL(
+            "private:stream", "_blank", 0, _props(InputStream=input_stream, Hidden=True)
+        )
+        if doc is None:
+            raise ConversionError("LibreOffice could not open the in-memory presentation")
+        output_stream = _BytesOutputStream()
+        try:
+            doc.storeToURL(
+                "private:stream",
+                _props(FilterName="impress_pdf_Export", OutputStream=output_stream),
+            )
+        finally:
+            doc.close(True)
+        return output_stream.getvalue()
+
+    def convert(self, pptx_path: str, pdf_path: str, timeout: float) -> str:
+        """Queues a conversion and waits for it; the server is restarted if the job times out or crashes it."""
+        return self._run(timeout, self._convert_now, pptx_path, pdf_path)
+
+    def convert_bytes(self, pptx_bytes: bytes, timeout: float) -> bytes:
+        """Like convert(), but streams the deck in and the PDF out over UNO without files."""
+        return self._run(timeout, self._convert_bytes_now, pptx_bytes)
+
+    def _run(self, timeout: float, job, *args):
+        """
+        Queues job and waits for it. timeout counts from when the job starts, not
+        from when it was queued, so only the job that actually hangs restarts the
+        server; a job that waits too long in the queue is cancelled instead.
+        """
+        started = threading.Event()
+
+        def _timed_job():
+            started.set()
+            return job(*args)
+
+        future = self._queue.submit(_timed_job)
+        if not started.wait(Config.PDF_QUEUE_TIMEOUT) and future.cancel():
+            print(f"⏱️ LibreOffice job waited over {Config.PDF_QUEUE_TIMEOUT}s in the {self.name} queue, cancelled")
+            raise ConversionError("PDF conversion waited too long in the queue")
+        # Started (or just starting, if cancel() lost the race)
+        started.wait()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            print(f"⏱️ LibreOffice job timed out after {timeout}s, restarting {self.name}")
+            self.stop()
+            raise ConversionError("PDF conversion timed out")
+        except Exception:
+            if not self.is_alive():
+                print(f"💥 LibreOffice server {self.name} crashed, it will restart on the next job")
+                self.stop()
+            raise
+
+def _profile_dir(name: str) -> str:
+    return os.path.join(Config.LIBREOFFICE_PROFILE_ROOT, name)
+
+def _convert_with_subprocess(pptx_path: str, output_dir: str, timeout: float) -> str:
+    """One-shot soffice run with an isolated profile, used when UNO is unavailable."""
+    profile = _profile_dir(f"oneshot-{os.getpid()}-{threading.get_ident()}")
+    cmd = [
+        Config.LIBREOFFICE_BIN, "--headless",
+        f"-env:UserInstallation=file://{profile}",
+        "--convert-to", "pdf",
+        "--outdir", output_dir,
+        pptx_path,
+    ]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+    pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf")
+    if process.returncode != 0 or not os.path.exists(pdf_path):
+        raise ConversionError(f"soffice failed: {process.stderr}")
+    return pdf_path
+
+_server = None
+_server_pid = None
+_server_lock = threading.Lock()
+
+def get_libreoffice_server() -> LibreOfficeServer:
+    """Returns this worker process's conversion server, creating it on first use."""
+    global _server, _server_pid
+    pid = os.getpid()
+    if _server is None or _server_pid != pid:
+        with _server_lock:
+            if _server is None or _server_pid != pid:
+                name = f"lo_{pid}"
+                _server = LibreOfficeServer(name, _profile_dir(name))
+                _server_pid = pid
+                atexit.register(_server.stop)
+    return _server
+
+def convert_to_pdf(pptx_path: str, output_dir: str = None) -> str:
+    """
+    Converts a PPTX file to PDF next to it (or in output_dir). Returns the PDF path.
+    """
+    output_dir = output_dir or os.path.dirname(pptx_path)
+    timeout = Config.PDF_CONVERT_TIMEOUT
+    if not HAS_UNO:
+        return _convert_with_subprocess(pptx_path, output_dir, timeout)
+
+    pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf")
+    return get_libreoffice_server().convert(pptx_path, pdf_path, timeout)
+
+def convert_bytes_to_pdf(pptx_bytes: bytes) -> bytes:
+    """
+    Converts an in-memory PPTX to PDF bytes. Without UNO the one-shot fallback
+    goes through a private temp dir (local disk, not the shared volume).
+    """
+    timeout = Config.PDF_CONVERT_TIMEOUT
+    if HAS_UNO:
+        return get_libreoffice_server().convert_bytes(pptx_bytes, timeout)
+
+    with tempfile.TemporaryDirectory(prefix="pptx-") as tmp_dir:
+        pptx_path = os.path.join(tmp_dir, "deck.pptx")
+        with open(pptx_path, "wb") as f:
+            f.write(pptx_bytes)
+        pdf_path = _convert_with_subprocess(pptx_path, tmp_dir, timeout)
+        with open(pdf_path, "rb") as f:
+            return f.read()
+
+def warm_up_in_background():
+    """Starts this process's LibreOffice server without blocking the caller (e.g. worker start-up)."""
+    if not HAS_UNO:
+        print(f"❌ No LibreOffice server for process {os.getpid()}: UNO bridge unusable ({UNO_IMPORT_ERROR})")
+        return
+
+    def _start():
+        try:
+            get_libreoffice_server().start()
+        except Exception as e:
+            print(f"⚠️ LibreOffice warm-up failed, will retry on first job: {e}")
+
+    threading.Thread(target=_start, name="lo-warmup", daemon=True).start()
@@ -1,10 +1,39 @@
 from pptx import Presentation
-from pptx.util import Inches, Pt
+from pptx.util import Inches
 from pptx.dml.color import RGBColor
+from pptx.oxml.ns import qn
+from lxml import etree
+import contextvars
+import functools
 import os
-import requests
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import quote
 from io import BytesIO
 from config import Config
+from utils.http_client import get_http_client
+from utils.counters import incr
+from utils.dedupe import first_seen, forget
+from utils.metrics import span, STAGE_IMAGE_FETCH
+from services.image_cache import ImageCache, get_image_cache
+
+# Pollinations render parameters. Fixed seed and size make renders deterministic,
+# which is what lets them be cached by query.
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 600
+IMAGE_SEED = 42
+
+# A fetch claims its image so concurrent requests for it (the analysis stream's
+# prefetch, the render stage, other workers) wait for the cache instead of
+# downloading it again. Covers the 15s request timeout plus a cache write.
+IMAGE_CLAIM_TTL = 30
+IMAGE_CLAIM_POLL = 0.25
+
+# Image downloads run on a bounded, per-process thread pool over the shared HTTP client.
+_image_executor = None
+_image_executor_pid = None
+_image_executor_lock = threading.Lock()
 
 def hex_to_rgb(hex_color):
     """Convert hex string (e.g., #FFFFFF) to RGB tuple."""
@@ -15,133 +44,280 @@ def hex_to_rgb(hex_color):
         return (0, 0, 0) # Fallback to black
 
 def download_image(query):
-    """Download an AI generated image from Pollinations.ai based on query."""
+    """Download an AI generated image from Pollinations.ai based on query, using the image cache first."""
+    cache = get_image_cache() if Config.IMAGE_CACHE_ENABLED else None
+    cache_key = ImageCache.make_key(query, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_SEED)
+    claim_key = None
+    if cache is not None:
+        try:
+            cached = cache.get(cache_key)
+            if cached is None:
+                cached, claim_key = _claim_or_wait(cache, cache_key)
+            if cached is not None:
+                return BytesIO(cached)
+        except Exception as e:
+            print(f"Image cache read failed for '{query}': {e}")
+
     try:
         # Encode query to URL safe
-        encoded_query = requests.utils.quote(query)
+        encoded_query = quote(query)
         # Request a specific size suitable for slides
-        url = f"https://image.pollinations.ai/prompt/{encoded_query}?width=800&height=600&nologo=true&seed=42"
+        url = (
+            f"https://image.pollinations.ai/prompt/{encoded_query}"
+            f"?width={IMAGE_WIDTH}&height={IMAGE_HEIGHT}&nologo=true&seed={IMAGE_SEED}"
+        )
         # Seed added for consistency, nologo to remove watermark if possible
-        response = requests.get(url, timeout=15) # Increased timeout for AI generation
+        with span(STAGE_IMAGE_FETCH):
+            response = get_http_client().get(url, timeout=15) # Increased timeout for AI generation
         if response.status_code == 200:
+            if cache is not None:
+                try:
+                    cache.put(cache_key, response.content)
+                except Exception as e:
+                    print(f"Image cache write failed for '{query}': {e}")
             return BytesIO(response.content)
+        if response.status_code == 429:
+            incr("images.rate_limited")
     except Exception as e:
         print(f"Error downloading image for '{query}': {e}")
+    finally:
+        if claim_key is not None:
+            forget(claim_key)
     return None
 
-def generate_pptx(data: dict, output_filename: str) -> str:
+def _claim_or_wait(cache: ImageCache, cache_key: str):
     """
-    Generates a PowerPoint file from the structured JSON data with Styles and Images.
+    Claims the fetch of an uncached image, or waits while someone else fetches it.
+    Returns (bytes, None) when the image shows up in the cache, or (None, claim_key)
+    when the caller should download it (claim_key is None if the wait ran out).
+    """
+    claim_key = f"image:{cache_key}"
+    deadline = time.monotonic() + IMAGE_CLAIM_TTL
+    while not first_seen(claim_key, IMAGE_CLAIM_TTL):
+        if time.monotonic() > deadline:
+            return None, None
+        time.sleep(IMAGE_CLAIM_POLL)
+        if not cache.exists(cache_key):
+            continue # Polls are not misses; only the arrival is counted (as a hit)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            incr("images.coalesced")
+            return cached, None
+    return None, claim_key
+
+def _get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor, _image_executor_pid
+    pid = os.getpid()
+    if _image_executor is None or _image_executor_pid != pid:
+        with _image_executor_lock:
+            if _image_executor is None or _image_executor_pid != pid:
+                _image_executor = ThreadPoolExecutor(
+                    max_workers=Config.IMAGE_FETCH_WORKERS,
+                    thread_name_prefix="slide-image",
+                )
+                _image_executor_pid = pid
+    return _image_executor
+
+def prefetch_images(slides: list) -> list:
+    """
+    Starts every slide image download at once. Returns one future (or None) per slide.
+    """
+    executor = _get_image_executor()
+    futures = []
+    for slide_data in slides:
+        query = slide_data.get("image_query")
+        # Run in the caller's context so fetch spans land on the caller's job
+        futures.append(executor.submit(contextvars.copy_context().run, download_image, query) if query else None)
+    return futures
+
+def _wait_for_image(future, deadline: float):
+    """Waits for one image future until the per-deck deadline; returns None on timeout."""
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        future.cancel()
+        print("⏱️ Image skipped: per-deck image deadline reached")
+    except Exception as e:
+        print(f"Error waiting for image: {e}")
+    return None
+
+# Base templates kept per process, one per (background, text, accent) palette
+_TEMPLATE_CACHE_SIZE = 32
+
+# Layout indexes in the default python-pptx template
+TITLE_LAYOUT = 0
+CONTENT_LAYOUT = 5 # "Title Only": its title placeholder is restyled as the content slide title
+
+def _hex(rgb) -> str:
+    return "%02X%02X%02X" % tuple(rgb)
+
+def _style_level(pPr, size=None, bold=None, color=None, space_after=None, align=None):
+    """Sets default run properties (and spacing/alignment) on an a:lvlNpPr element."""
+    if align is not None:
+        pPr.set("algn", align)
+    if space_after is not None:
+        for old in pPr.findall(qn("a:spcAft")):
+            pPr.remove(old)
+        spc_aft = etree.Element(qn("a:spcAft"))
+        etree.SubElement(spc_aft, qn("a:spcPts")).set("val", str(int(space_after * 100)))
+        # Schema order: lnSpc, spcBef, spcAft, ...
+        anchor = pPr.find(qn("a:spcBef"))
+        if anchor is None:
+            anchor = pPr.find(qn("a:lnSpc"))
+        if anchor is not None:
+            anchor.addnext(spc_aft)
+        else:
+            pPr.insert(0, spc_aft)
+
+    def_rpr = pPr.find(qn("a:defRPr"))
+    if def_rpr is None:
+        def_rpr = etree.SubElement(pPr, qn("a:defRPr"))
+    if size is not None:
+        def_rpr.set("sz", str(int(size * 100)))
+    if bold is not None:
+        def_rpr.set("b", "1" if bold else "0")
+    if color is not None:
+        for old in def_rpr.findall(qn("a:solidFill")):
+            def_rpr.remove(old)
+        fill = etree.Element(qn("a:solidFill"))
+        etree.SubElement(fill, qn("a:srgbClr")).set("val", color)
+        def_rpr.insert(0, fill)
+
+def _level1(parent, tag: str):
+    """Returns (creating if needed) the a:lvl1pPr under parent/tag."""
+    container = parent.find(qn(tag))
+    if container is None:
+        container = etree.SubElement(parent, qn(tag))
+    lvl1 = container.find(qn("a:lvl1pPr"))
+    if lvl1 is None:
+        lvl1 = etree.Element(qn("a:lvl1pPr"))
+        container.insert(0, lvl1)
+    return lvl1
+
+@functools.lru_cache(maxsize=_TEMPLATE_CACHE_SIZE)
+def _base_template(bg_hex: str, text_hex: str, accent_hex: str) -> bytes:
+    """
+    Builds the pre-styled base deck for one palette, once per worker process.
+
+    The background lives on the slide master and all text styling lives in the
+    master/presentation text styles, so slides built from it only carry content.
     """
     prs = Presentation()
-    
-    # Extract Visual Style
+    master = prs.slide_master
+
+    fill = master.background.fill
+    fill.solid()
+    fill.fore_color.rgb = RGBColor.from_string(bg_hex)
+
+    tx_styles = master._element.find(qn("p:txStyles"))
+    # Titles: accent colour (title slide keeps its layout size, content titles are set below)
+    _style_level(_level1(tx_styles, "p:titleStyle"), color=accent_hex)
+    # Free text boxes (content bullets): text colour, 20pt, 14pt after each paragraph
+    for level in (_level1(tx_styles, "p:otherStyle"), _level1(prs._element, "p:defaultTextStyle")):
+        _style_level(level, size=20, color=text_hex, space_after=14)
+
+    # Title slide subtitle in the text colour
+    subtitle = prs.slide_layouts[TITLE_LAYOUT].placeholders[1]
+    _style_level(_level1(subtitle._element.txBody, "a:lstStyle"), color=text_hex)
+
+    # Content slide title: same box and look as the former per-slide title textbox
+    content_title = prs.slide_layouts[CONTENT_LAYOUT].placeholders[0]
+    content_title.left, content_title.top = Inches(0.5), Inches(0.4)
+    content_title.width, content_title.height = Inches(9), Inches(1)
+    content_title._element.txBody.find(qn("a:bodyPr")).set("anchor", "t")
+    _style_level(_level1(content_title._element.txBody, "a:lstStyle"), size=36, bold=True, align="l")
+
+    # Create the notes master now rather than on the first notes slide of every deck
+    prs.notes_master
+
+    buffer = BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+def _palette(data: dict):
     style = data.get("visual_style", {})
-    bg_color_hex = style.get("background_color", "#FFFFFF")
-    text_color_hex = style.get("text_color", "#000000")
-    accent_color_hex = style.get("accent_color", "#0000FF")
-    
-    bg_rgb = hex_to_rgb(bg_color_hex)
-    text_rgb = hex_to_rgb(text_color_hex)
-    accent_rgb = hex_to_rgb(accent_color_hex)
+    return (
+        _hex(hex_to_rgb(style.get("background_color", "#FFFFFF"))),
+        _hex(hex_to_rgb(style.get("text_color", "#000000"))),
+        _hex(hex_to_rgb(style.get("accent_color", "#0000FF"))),
+    )
+
+def build_presentation(data: dict) -> Presentation:
+    """
+    Builds the deck on top of the cached base template for its visual_style palette.
+    """
+    prs = Presentation(BytesIO(_base_template(*_palette(data))))
+
+    # Fire all image downloads up front; slides below pick them up in order
+    slides = data.get("slides", [])
+    image_futures = prefetch_images(slides)
+    image_deadline = time.monotonic() + Config.IMAGE_DECK_DEADLINE
 
     # --- Title Slide ---
-    title_slide_layout = prs.slide_layouts[0]
-    slide = prs.slides.add_slide(title_slide_layout)
-    
-    # Apply Background
-    background = slide.background
-    fill = background.fill
-    fill.solid()
-    fill.fore_color.rgb = RGBColor(*bg_rgb)
-    
-    title = slide.shapes.title
-    subtitle = slide.placeholders[1]
-    
-    title.text = data.get("title", "Generated Presentation")
-    # Apply accent color to title
-    if title.text_frame:
-        for p in title.text_frame.paragraphs:
-            p.font.color.rgb = RGBColor(*accent_rgb)
-    
-    subtitle.text = "Generated by AI Voice-to-Presentation"
-    # Apply text color to subtitle
-    if subtitle.text_frame:
-        for p in subtitle.text_frame.paragraphs:
-            p.font.color.rgb = RGBColor(*text_rgb)
-    
+    slide = prs.slides.add_slide(prs.slide_layouts[TITLE_LAYOUT])
+    slide.shapes.title.text = data.get("title", "Generated Presentation")
+    slide.placeholders[1].text = "Generated by AI Voice-to-Presentation"
+
     # --- Content Slides ---
-    # Using Blank layout (6) to custom position everything for better design control
-    blank_slide_layout = prs.slide_layouts[6] 
-    
-    for slide_data in data.get("slides", []):
-        slide = prs.slides.add_slide(blank_slide_layout)
-        
-        # Apply Background
-        background = slide.background
-        fill = background.fill
-        fill.solid()
-        fill.fore_color.rgb = RGBColor(*bg_rgb)
-        
-        # 1. Title (Top, Full Width)
-        # Left, Top, Width, Height
-        title_shape = slide.shapes.add_textbox(Inches(0.5), Inches(0.4), Inches(9), Inches(1))
-        title_tf = title_shape.text_frame
-        title_tf.text = slide_data.get("title", "Untitled Slide")
-        title_p = title_tf.paragraphs[0]
-        title_p.font.size = Pt(36)
-        title_p.font.bold = True
-        title_p.font.color.rgb = RGBColor(*accent_rgb)
-        
-        # 2. Image (Right Side) - Try to fetch if query exists
-        image_stream = None
-        if "image_query" in slide_data:
-            print(f"Downloading image: {slide_data['image_query']}")
-            image_stream = download_image(slide_data["image_query"])
-            
+    content_layout = prs.slide_layouts[CONTENT_LAYOUT]
+    for slide_data, image_future in zip(slides, image_futures):
+        slide = prs.slides.add_slide(content_layout)
+
+        # 1. Title (top, full width; position and style come from the layout)
+        slide.shapes.title.text = slide_data.get("title", "Untitled Slide")
+
+        # 2. Image (Right Side)
+        image_stream = _wait_for_image(image_future, image_deadline)
         if image_stream:
             # Layout: Text Left, Image Right
-            # Image: Left=5.5, Top=1.8, Width=4
             try:
                 slide.shapes.add_picture(image_stream, Inches(5.5), Inches(1.8), width=Inches(4))
             except Exception as img_err:
                 print(f"Failed to add picture to slide: {img_err}")
-            
+
             # Content Text Box (Left Side, narrower)
             body_shape = slide.shapes.add_textbox(Inches(0.5), Inches(1.8), Inches(4.8), Inches(5))
         else:
             # Layout: Full Width Text
             body_shape = slide.shapes.add_textbox(Inches(0.5), Inches(1.8), Inches(9), Inches(5))
-            
+
         tf = body_shape.text_frame
         tf.word_wrap = True
-        
-        bullet_points = slide_data.get("bullet_points", [])
-        if bullet_points:
-            # First point (needed because text_frame starts with one empty paragraph)
-            p = tf.paragraphs[0]
-            p.text = bullet_points[0]
-            p.font.size = Pt(20)
-            p.font.color.rgb = RGBColor(*text_rgb)
-            p.space_after = Pt(14)
+
+        # Font size, colour and spacing are inherited from the template text styles
+        for i, point in enumerate(slide_data.get("bullet_points", [])):
+            p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
             # Use a dash as bullet visually since we are using textbox
-            if not p.text.startswith("-") and not p.text.startswith("•"):
-                p.text = "• " + p.text
-            
-            # Other points
-            for point in bullet_points[1:]:
-                p = tf.add_paragraph()
-                p.text = "• " + point
-                p.font.size = Pt(20)
-                p.font.color.rgb = RGBColor(*text_rgb)
-                p.space_after = Pt(14)
-        
+            p.text = point if i == 0 and point.startswith(("-", "•")) else "• " + point
+
         # Add speaker notes
-        notes_slide = slide.notes_slide
-        text_frame = notes_slide.notes_text_frame
-        text_frame.text = slide_data.get("speaker_notes", "")
-        
+        slide.notes_slide.notes_text_frame.text = slide_data.get("speaker_notes", "")
+
+    return prs
+
+def generate_pptx(data: dict, output_filename: str) -> str:
+    """
+    Generates a PowerPoint file from the structured JSON data with Styles and Images.
+    """
+    prs = build_presentation(data)
     output_path = os.path.join(Config.OUTPUT_DIR, output_filename)
     prs.save(output_path)
-    
     return output_path
+
+def render_pptx_bytes(data: dict) -> bytes:
+    """
+    Builds the deck into memory and returns the PPTX bytes, without touching disk.
+    """
+    buffer = BytesIO()
+    build_presentation(data).save(buffer)
+    return buffer.getvalue()
+
+def warm_up():
+    """
+    Builds the default palette's base template, parses it once and starts the
+    image pool, so a worker process's first deck does not pay for it.
+    """
+    Presentation(BytesIO(_base_template(*_palette({}))))
+    _get_image_executor()
@@ -0,0 +1,56 @@
+from typing import List
+from pydantic import BaseModel
+
+# Typed shape of the analysis JSON. Sent to Gemini as the response schema and
+# used to validate what comes back before it reaches the renderers.
+
+class VisualStyle(BaseModel):
+    background_color: str = "#FFFFFF"
+    text_color: str = "#000000"
+    accent_color: str = "#0000FF"
+    vibe: str = "Professional"
+
+class Slide(BaseModel):
+    title: str
+    layout_type: str = "Title Only"
+    bullet_points: List[str] = []
+    image_query: str = ""
+    speaker_notes: str = ""
+
+class PresentationData(BaseModel):
+    title: str
+    interpretation: str = "Topic identified."
+    visual_style: VisualStyle = VisualStyle()
+    slides: List[Slide]
+
+class SegmentSummary(BaseModel):
+    """Map-step output for one segment of a long recording."""
+    topics: List[str] = []
+    key_points: List[str] = []
+    data_points: List[str] = []
+    objective_hints: str = ""
+    tone: str = ""
+
+# Keys of a JSON schema that Gemini's response schema understands
+_GEMINI_SCHEMA_KEYS = {"type", "format", "description", "enum", "items", "properties", "required", "nullable"}
+
+def gemini_schema(model) -> dict:
+    """
+    The pydantic model's JSON schema in the subset Gemini accepts: $refs inlined,
+    defaults and titles dropped, and every property required so the model fills them all.
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def convert(node: dict) -> dict:
+        if "$ref" in node:
+            node = defs[node["$ref"].rsplit("/", 1)[-1]]
+        out = {k: v for k, v in node.items() if k in _GEMINI_SCHEMA_KEYS}
+        if "properties" in out:
+            out["properties"] = {name: convert(prop) for name, prop in out["properties"].items()}
+            out["required"] = list(out["properties"])
+        if "items" in out:
+            out["items"] = convert(out["items"])
+        return out
+
+    return convert(schema)
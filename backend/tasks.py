@@ -1,33 +1,158 @@
-from celery import Celery
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from celery import chain
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_init, worker_ready, worker_process_init, worker_process_shutdown, task_postrun
 from config import Config
-from services.gemini_service import analyze_audio
-from services.pptx_service import generate_pptx
+from celery_client import celery_app, submit_once, PROCESS_AUDIO
+from services.gemini_service import analyze_audio, warm_up as warm_up_gemini
+from services.pptx_service import generate_pptx, render_pptx_bytes, warm_up as warm_up_pptx
 from services.plus_service import PlusAIService
-from utils.whatsapp import send_whatsapp_document
+from services.pdf_service import convert_to_pdf, convert_bytes_to_pdf, warm_up_in_background
+from services.artifact_store import get_artifact_store, KIND_UPLOAD, KIND_PPTX, KIND_PDF
+from utils.http_client import get_http_client
+from utils.whatsapp import send_whatsapp_documents, send_whatsapp_message, download_media
+from utils.progress import publish_progress
+from utils.counters import incr
+from utils.metrics import (
+    collect_spans, span, observe, summarize_spans, start_worker_exporter, mark_process_dead, record_startup,
+    STAGE_PPTX_BUILD, STAGE_PDF_CONVERT, STAGE_WHATSAPP_SEND,
+)
+import json
+import contextlib
 import os
+import tempfile
+import threading
 import uuid
 import logging
-import subprocess
 import traceback
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-celery_app = Celery("worker", broker=Config.REDIS_URL, backend=Config.REDIS_URL)
+# Module load, including Gemini, python-pptx and LibreOffice bindings
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+# Long-lived per-process resources the tasks of each queue use
+_QUEUE_RESOURCES = {
+    "analyze": {"http", "gemini"},
+    # In-memory decks are also converted by the render task
+    "render": {"http", "pptx", "libreoffice"} if Config.PPTX_IN_MEMORY else {"http", "pptx"},
+    "convert": {"libreoffice"},
+    "deliver": {"http"},
+}
+
+# Queues this worker consumes; empty outside a worker, where everything is warmed
+_worker_queues = set()
+
+def warm_up_process():
+    """
+    Builds this process's reusable resources before its first task: the HTTP
+    pool, the Gemini loop and model handles, the base PPTX template and the
+    LibreOffice server, limited to what the worker's queues need. Runs in the
+    background; every resource is also created (and health-checked) on use.
+    """
+    needed = set().union(*(_QUEUE_RESOURCES.get(q, set()) for q in _worker_queues)) if _worker_queues else None
+    warmers = [("http", get_http_client), ("gemini", warm_up_gemini), ("pptx", warm_up_pptx)]
+    if needed is None or "libreoffice" in needed:
+        # Each worker process gets its own LibreOffice server and profile
+        warm_up_in_background()
+
+    def _warm():
+        started = time.perf_counter()
+        for name, warm in warmers:
+            if needed is not None and name not in needed:
+                continue
+            try:
+                warm()
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up of {name} failed, it will be built on first use: {e}")
+        logger.info(f"🔥 Process {os.getpid()} warmed up in {time.perf_counter() - started:.2f}s")
+
+    threading.Thread(target=_warm, name="warm-up", daemon=True).start()
+
+@worker_init.connect
+def start_metrics_exporter(sender=None, **kwargs):
+    # Queues selected with -Q; read here so prefork children inherit them
+    _worker_queues.update(sender.app.amqp.queues.consume_from or ())
+    start_worker_exporter(Config.WORKER_METRICS_PORT)
+
+@worker_ready.connect
+def record_worker_startup(sender=None, **kwargs):
+    record_startup("worker", IMPORT_SECONDS)
+    # Prefork children warm up in worker_process_init; other pools run tasks in this process
+    if not isinstance(getattr(sender, "pool", None), PreforkPool):
+        warm_up_process()
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    warm_up_process()
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+def _update_progress(job_id: str, meta: dict):
+    """
+    Records PROGRESS meta under the job id the client polls, whichever stage is running.
+    """
+    celery_app.backend.store_result(job_id, meta, 'PROGRESS')
+    publish_progress(job_id, {"task_id": job_id, "status": "PROGRESS", "result": None, "info": meta})
+
+# Tasks whose id is the job id the client follows: the entry task (when it
+# finishes without handing over to the chain) and the last chain step.
+_JOB_RESULT_TASKS = {"process_audio_presentation", "deliver_presentation", "build_presentation_in_memory"}
+
+@task_postrun.connect
+def publish_final_state(sender=None, task_id=None, retval=None, state=None, **kwargs):
+    if sender is None or sender.name not in _JOB_RESULT_TASKS or state not in ("SUCCESS", "FAILURE"):
+        return
+    result = retval if state == "SUCCESS" else None
+    info = result if isinstance(result, dict) else str(retval)
+    publish_progress(task_id, {"task_id": task_id, "status": state, "result": result, "info": info})
+
+def _error_payload(e: Exception) -> dict:
+    logger.error(f"🔥 CRITICAL TASK ERROR: {e}")
+    logger.error(traceback.format_exc())
+    return {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+
+@contextlib.contextmanager
+def _local_audio(audio_ref: str):
+    """
+    A local path for a job's audio. audio_ref is an upload artifact name, or an
+    absolute path for jobs queued before uploads went through the artifact store.
+    """
+    if os.path.isabs(audio_ref):
+        if not os.path.exists(audio_ref):
+            raise FileNotFoundError(audio_ref)
+        yield audio_ref
+    else:
+        with get_artifact_store().local_path(audio_ref) as path:
+            yield path
 
 @celery_app.task(name="process_audio_presentation", bind=True)
-def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None):
+def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None, audio_sha256: str = None):
     """
-    Background task to process audio, generate PPTX, convert to PDF, and optionally send via WhatsApp.
+    Pipeline entry point: analyzes the audio, then hands over to the render -> convert -> deliver chain.
+    audio_path is the upload's artifact name (or a local path).
+
+    The chain replaces this task and its last step inherits this task id, so
+    `/task/{task_id}` keeps reporting progress and the final result under the
+    id returned to the client.
     """
+    job_id = self.request.id
     logger.info(f"🚀 TASK STARTED: Processing {audio_path}")
-    
+
     # Notify Start
-    self.update_state(state='PROGRESS', meta={'status': 'Analyzing audio with Gemini AI...', 'progress': 10})
-    
+    _update_progress(job_id, {'status': 'Analyzing audio with Gemini AI...', 'progress': 10})
+
     # Debug: Check if audio file exists
-    if not os.path.exists(audio_path):
+    audio_files = contextlib.ExitStack()
+    try:
+        local_audio_path = audio_files.enter_context(_local_audio(audio_path))
+    except FileNotFoundError:
         error_msg = f"❌ Audio file not found at: {audio_path}"
         logger.error(error_msg)
         return {"status": "error", "error": error_msg}
@@ -35,30 +160,102 @@ def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None):
     try:
         # Step 1: Analyze Audio with Gemini
         logger.info("🤖 Step 1: Sending audio to Gemini...")
-        presentation_data = analyze_audio(audio_path)
+        analysis_stats = {}
+        spans = []
+        with collect_spans(spans):
+            presentation_data = analyze_audio(local_audio_path, audio_sha256, analysis_stats)
         logger.info(f"✅ Gemini Response: {str(presentation_data)[:100]}...") # Log first 100 chars
-        
+        audio_report = analysis_stats.get("audio")
+        if audio_report:
+            logger.info(
+                f"🎚️ Audio upload: {audio_report['bytes_saved']} bytes saved, "
+                f"~{audio_report['upload_seconds_saved']}s of {audio_report['upload_seconds']}s upload time saved"
+            )
+
         if "title" not in presentation_data:
              logger.error(f"❌ Gemini returned invalid data: {presentation_data}")
              return {"status": "error", "error": "AI failed to extract structure from audio"}
-             
+
         if presentation_data.get("title") == "Processing Error":
              logger.error(f"❌ Gemini Processing Error: {presentation_data}")
              return {"status": "error", "error": "AI Service Unavailable (Quota or Error). Try again later."}
 
         interpretation = presentation_data.get("interpretation", "Topic identified.")
-        
+
         # Notify Analysis Complete
-        self.update_state(state='PROGRESS', meta={
+        _update_progress(job_id, {
             'status': 'Structure generated. Designing slides...',
             'progress': 30,
-            'interpretation': interpretation
+            'interpretation': interpretation,
+            'audio_preprocessing': audio_report,
         })
+    except Exception as e:
+        return _error_payload(e)
+    finally:
+        audio_files.close()
+
+    payload = {
+        "job_id": job_id,
+        "audio_path": audio_path,
+        "whatsapp_to": whatsapp_to,
+        "presentation_data": presentation_data,
+        "interpretation": interpretation,
+        "audio_report": audio_report,
+        "spans": spans,
+    }
+    stages = _pipeline_stages()
+    if self.request.is_eager:
+        # Celery cannot apply a chain from inside an eager task; run the stages inline
+        # (through apply(), so a stage that retries, like the Plus AI poll, runs again)
+        for stage in stages:
+            payload = stage.apply(args=(payload,)).get()
+        return payload
+    return self.replace(chain(stages[0].clone(args=(payload,)), *stages[1:]))
+
+def _pipeline_stages() -> list:
+    """Signatures of the tasks that follow analysis, in order. Each takes and returns the job payload."""
+    if Config.PLUSAI_API_KEY:
+        # A deck is never ready right after submission: the first poll waits one interval
+        poll = poll_plus_presentation.s().set(countdown=Config.PLUSAI_POLL_INTERVAL)
+        return [render_presentation.s(), poll, convert_presentation.s(), deliver_presentation.s()]
+    if Config.PPTX_IN_MEMORY:
+        # Local decks are finished from one in-memory buffer, so there is nothing to hand between stages
+        return [build_presentation_in_memory.s()]
+    return [render_presentation.s(), convert_presentation.s(), deliver_presentation.s()]
+
+def _verify_pptx(pptx_path: str):
+    """Returns an error payload if the PPTX is missing on disk, otherwise None."""
+    # Debug: Check if PPTX file exists physically
+    if os.path.exists(pptx_path):
+        logger.info(f"💾 FILE VERIFIED: {pptx_path} exists on disk. Size: {os.path.getsize(pptx_path)} bytes")
+        return None
+    return {"status": "error", "error": f"File generated but not found at {pptx_path}"}
+
+def _store_output(path: str, filename: str, kind: str) -> str:
+    """Moves a generated file into the artifact store. Returns its location."""
+    store = get_artifact_store()
+    meta = store.put_file(path, filename, kind)
+    location = store.location(meta)
+    logger.info(f"💾 Stored {filename} at {location}")
+    return location
 
+@celery_app.task(name="render_presentation")
+def render_presentation(payload: dict):
+    """
+    Step 2: builds the PPTX locally or with Plus AI.
+    """
+    if payload.get("status") == "error":
+        return payload
+
+    job_id = payload["job_id"]
+    presentation_data = payload["presentation_data"]
+    interpretation = payload["interpretation"]
+
+    try:
         # Step 2: Generate PPTX
         filename = f"presentation_{uuid.uuid4()}.pptx"
         logger.info(f"🎨 Step 2: Generating PPTX: {filename}")
-        
+
         # Debug Log for Plus AI Key
         if Config.PLUSAI_API_KEY:
              logger.info(f"🔑 PLUSAI_API_KEY detected: {Config.PLUSAI_API_KEY[:5]}***")
@@ -69,13 +266,13 @@ def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None):
             if Config.PLUSAI_API_KEY:
                 # Use Plus AI (Professional)
                 logger.info("✨ Using Plus AI API for generation...")
-                
-                self.update_state(state='PROGRESS', meta={
+
+                _update_progress(job_id, {
                     'status': 'Generating professional slides with Plus AI (this takes ~2 mins)...',
                     'progress': 40,
                     'interpretation': interpretation
                 })
-                
+
                 # Construct a rich prompt based on Gemini's detailed structure
                 slides_content = ""
                 for i, slide in enumerate(presentation_data.get('slides', []), 1):
@@ -90,80 +287,175 @@ def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None):
                     f"Use this exact structure:\n{slides_content}\n\n"
                     f"Style: {presentation_data.get('visual_style', {}).get('vibe', 'Professional')}."
                 )
-                
+
                 # Ensure prompt isn't too long (Plus AI limit might be ~4000 chars, let's keep it safe)
-                prompt_text = prompt_text[:3500] 
-                pptx_path = PlusAIService.generate_presentation(prompt_text, filename)
+                prompt_text = prompt_text[:3500]
+                polling_url = PlusAIService.submit_presentation(prompt_text)
+                logger.info(f"⏳ Plus AI job submitted, polling {polling_url}")
+
+                # poll_plus_presentation picks it up from here without holding this worker
+                return {
+                    **payload,
+                    "filename": filename,
+                    "plus_polling_url": polling_url,
+                    "plus_submitted_at": time.time(),
+                    "plus_deadline": time.time() + Config.PLUSAI_TIMEOUT,
+                }
             else:
                 # Use Local Generator (Basic)
                 logger.info("🛠️ Using Local Generator...")
-                
-                self.update_state(state='PROGRESS', meta={
+
+                _update_progress(job_id, {
                     'status': 'Generating slides and creating AI images locally...',
                     'progress': 40,
                     'interpretation': interpretation
                 })
-                
-                pptx_path = generate_pptx(presentation_data, filename)
-                
+
+                with collect_spans(payload.setdefault("spans", [])), span(STAGE_PPTX_BUILD):
+                    pptx_path = generate_pptx(presentation_data, filename)
+
             logger.info(f"✅ PPTX Generation called. Returned path: {pptx_path}")
         except Exception as pptx_error:
             logger.error(f"❌ Error in generate_pptx: {pptx_error}")
             raise pptx_error
 
-        # Debug: Check if PPTX file exists physically
-        if os.path.exists(pptx_path):
-            logger.info(f"💾 FILE VERIFIED: {pptx_path} exists on disk. Size: {os.path.getsize(pptx_path)} bytes")
-        else:
-            return {"status": "error", "error": f"File generated but not found at {pptx_path}"}
-        
-        # Step 2.5: Convert to PDF
-        self.update_state(state='PROGRESS', meta={
-            'status': 'Converting presentation to PDF...',
-            'progress': 80,
-            'interpretation': interpretation
-        })
-        
-        pdf_filename = filename.replace(".pptx", ".pdf")
-        pdf_path = pptx_path.replace(".pptx", ".pdf")
-        output_dir = os.path.dirname(pptx_path)
-        
-        logger.info(f"📄 Step 2.5: Converting to PDF: {pdf_filename}")
-        
+        missing = _verify_pptx(pptx_path)
+        if missing:
+            return missing
+        pptx_path = _store_output(pptx_path, filename, KIND_PPTX)
+    except Exception as e:
+        return _error_payload(e)
+
+    return {**payload, "filename": filename, "pptx_path": pptx_path}
+
+# Backstop for the PLUSAI_TIMEOUT deadline: even at the shortest interval a job
+# cannot poll more often than this
+PLUS_MAX_POLLS = int(Config.PLUSAI_TIMEOUT // max(Config.PLUSAI_POLL_INTERVAL, 1)) + 1
+
+@celery_app.task(name="poll_plus_presentation", bind=True, max_retries=PLUS_MAX_POLLS)
+def poll_plus_presentation(self, payload: dict):
+    """
+    Step 2 (Plus AI): polls the submitted generation, re-scheduling itself with a
+    backoff countdown until the deck is GENERATED, then streams it to disk. The
+    job fails once PLUSAI_TIMEOUT has passed since submission.
+    """
+    if payload.get("status") == "error" or not payload.get("plus_polling_url"):
+        return payload
+
+    try:
+        pptx_url = PlusAIService.check_presentation(payload["plus_polling_url"])
+    except Exception as e:
+        return _error_payload(e)
+
+    if not pptx_url:
+        remaining = payload["plus_deadline"] - time.time()
+        if remaining <= 0 or self.request.retries >= self.max_retries:
+            logger.error(f"❌ Plus AI gave up after {self.request.retries + 1} polls")
+            return {"status": "error", "error": "Plus AI timed out generating presentation"}
+        countdown = min(
+            Config.PLUSAI_POLL_INTERVAL * (1.5 ** self.request.retries),
+            Config.PLUSAI_POLL_MAX_INTERVAL,
+            remaining, # Last poll lands on the deadline
+        )
+        raise self.retry(countdown=countdown)
+
+    try:
+        pptx_path = PlusAIService.download_presentation(pptx_url, payload["filename"])
+        # Plus AI builds the deck remotely: the span runs from submission to download
+        with collect_spans(payload.setdefault("spans", [])):
+            observe(STAGE_PPTX_BUILD, time.time() - payload.get("plus_submitted_at", time.time()), provider="plus")
+        logger.info(f"✅ PPTX Generation called. Returned path: {pptx_path}")
+        missing = _verify_pptx(pptx_path)
+        if missing:
+            return missing
+        pptx_path = _store_output(pptx_path, payload["filename"], KIND_PPTX)
+    except Exception as e:
+        return _error_payload(e)
+
+    result = {k: v for k, v in payload.items() if not k.startswith("plus_")}
+    return {**result, "pptx_path": pptx_path}
+
+@celery_app.task(name="convert_presentation")
+def convert_presentation(payload: dict):
+    """
+    Step 2.5: converts the PPTX to PDF. A failed conversion still delivers the PPTX.
+    """
+    if payload.get("status") == "error":
+        return payload
+
+    filename = payload["filename"]
+
+    # Step 2.5: Convert to PDF
+    _update_progress(payload["job_id"], {
+        'status': 'Converting presentation to PDF...',
+        'progress': 80,
+        'interpretation': payload["interpretation"]
+    })
+
+    pdf_filename = filename.replace(".pptx", ".pdf")
+    pdf_path = None
+
+    logger.info(f"📄 Step 2.5: Converting to PDF: {pdf_filename}")
+
+    try:
+        # Convert on this worker's long-lived LibreOffice server, into a private temp dir
+        with get_artifact_store().local_path(filename) as pptx_path, tempfile.TemporaryDirectory() as tmp_dir:
+            with collect_spans(payload.setdefault("spans", [])), span(STAGE_PDF_CONVERT):
+                local_pdf = convert_to_pdf(pptx_path, tmp_dir)
+            pdf_path = _store_output(local_pdf, pdf_filename, KIND_PDF)
+        logger.info(f"✅ PDF Generated successfully at {pdf_path}")
+    except Exception as pdf_error:
+        logger.error(f"❌ Exception converting to PDF: {pdf_error}")
+        incr("pdf.conversion_failures")
+        pdf_filename = None # Mark as failed but return PPTX
+
+    return {**payload, "pdf_filename": pdf_filename, "pdf_path": pdf_path if pdf_filename else None}
+
+@celery_app.task(name="deliver_presentation")
+def deliver_presentation(payload: dict):
+    """
+    Step 3: optionally sends the files via WhatsApp and returns the final job result.
+    """
+    if payload.get("status") == "error":
+        return payload
+
+    store = get_artifact_store()
+    with contextlib.ExitStack() as files:
         try:
-            # Run LibreOffice headless conversion
-            cmd = [
-                "libreoffice", "--headless", "--convert-to", "pdf", 
-                "--outdir", output_dir, 
-                pptx_path
-            ]
-            process = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if process.returncode == 0 and os.path.exists(pdf_path):
-                logger.info(f"✅ PDF Generated successfully at {pdf_path}")
-            else:
-                logger.error(f"❌ PDF Conversion failed. Stderr: {process.stderr}")
-                pdf_filename = None # Mark as failed but return PPTX
-                
-        except Exception as pdf_error:
-            logger.error(f"❌ Exception converting to PDF: {pdf_error}")
-            pdf_filename = None
+            names = [payload["filename"]]
+            if payload.get("pdf_filename") and store.stat(payload["pdf_filename"]) is not None:
+                names.append(payload["pdf_filename"])
+            documents = [(files.enter_context(store.local_path(name)), name) for name in names]
+        except Exception as e:
+            return _error_payload(e)
+        return _deliver(payload, documents)
+
+def _deliver(payload: dict, documents: list) -> dict:
+    """Sends documents ((path or bytes, filename) pairs) to WhatsApp if requested and builds the final result."""
+    try:
+        whatsapp_to = payload.get("whatsapp_to")
+        interpretation = payload["interpretation"]
+        filename = payload["filename"]
+        pptx_path = payload["pptx_path"]
+        pdf_filename = payload.get("pdf_filename")
 
         # Step 3: Send via WhatsApp if recipient provided
         if whatsapp_to:
             logger.info(f"📱 Step 3: Sending to WhatsApp {whatsapp_to}")
-            self.update_state(state='PROGRESS', meta={
+            _update_progress(payload["job_id"], {
                 'status': 'Sending to WhatsApp...',
                 'progress': 95,
                 'interpretation': interpretation
             })
-            send_whatsapp_document(whatsapp_to, pptx_path, filename)
-            if pdf_filename and os.path.exists(pdf_path):
-                 send_whatsapp_document(whatsapp_to, pdf_path, pdf_filename)
-            
+            # PPTX and PDF upload concurrently
+            with collect_spans(payload.setdefault("spans", [])), span(STAGE_WHATSAPP_SEND):
+                send_whatsapp_documents(whatsapp_to, documents)
+
+        timings = summarize_spans(payload.get("spans", []))
+        logger.info(f"⏱️ Job {payload['job_id']} stage timings: {json.dumps(timings)}")
         return {
-            "status": "success", 
-            "pptx_path": pptx_path, 
+            "status": "success",
+            "pptx_path": pptx_path,
             "filename": filename,
             "pdf_filename": pdf_filename,
             "interpretation": interpretation,
@@ -171,11 +463,103 @@ def process_audio_presentation(self, audio_path: str, whatsapp_to: str = None):
                 "audio_found": True,
                 "ai_success": True,
                 "file_created": True,
-                "path": pptx_path
+                "path": pptx_path,
+                "audio_preprocessing": payload.get("audio_report"),
+                "timings": timings,
+                "spans": payload.get("spans", []),
             }
         }
 
     except Exception as e:
-        logger.error(f"🔥 CRITICAL TASK ERROR: {e}")
-        logger.error(traceback.format_exc())
-        return {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+        return _error_payload(e)
+
+@celery_app.task(name="build_presentation_in_memory")
+def build_presentation_in_memory(payload: dict):
+    """
+    Steps 2-3 for the local generator in in-memory mode: builds the deck into one
+    buffer, then converts, uploads and stores it from that buffer. Each output is
+    written to disk once, in the artifact store.
+    """
+    if payload.get("status") == "error":
+        return payload
+
+    job_id = payload["job_id"]
+    interpretation = payload["interpretation"]
+    store = get_artifact_store()
+
+    try:
+        filename = f"presentation_{uuid.uuid4()}.pptx"
+        logger.info(f"🎨 Step 2: Generating PPTX in memory: {filename}")
+        _update_progress(job_id, {
+            'status': 'Generating slides and creating AI images locally...',
+            'progress': 40,
+            'interpretation': interpretation
+        })
+        with collect_spans(payload.setdefault("spans", [])), span(STAGE_PPTX_BUILD):
+            pptx_bytes = render_pptx_bytes(payload["presentation_data"])
+        pptx_path = store.location(store.put_bytes(pptx_bytes, filename, KIND_PPTX))
+        logger.info(f"💾 PPTX stored: {pptx_path} ({len(pptx_bytes)} bytes)")
+    except Exception as e:
+        return _error_payload(e)
+
+    _update_progress(job_id, {
+        'status': 'Converting presentation to PDF...',
+        'progress': 80,
+        'interpretation': interpretation
+    })
+    pdf_filename = filename.replace(".pptx", ".pdf")
+    pdf_path = None
+    documents = [(pptx_bytes, filename)]
+    try:
+        with collect_spans(payload["spans"]), span(STAGE_PDF_CONVERT):
+            pdf_bytes = convert_bytes_to_pdf(pptx_bytes)
+        pdf_path = store.location(store.put_bytes(pdf_bytes, pdf_filename, KIND_PDF))
+        documents.append((pdf_bytes, pdf_filename))
+        logger.info(f"✅ PDF Generated successfully at {pdf_path}")
+    except Exception as pdf_error:
+        logger.error(f"❌ Exception converting to PDF: {pdf_error}")
+        incr("pdf.conversion_failures")
+        pdf_filename = None # Mark as failed but return PPTX
+
+    payload = {**payload, "filename": filename, "pptx_path": pptx_path, "pdf_filename": pdf_filename, "pdf_path": pdf_path}
+    return _deliver(payload, documents)
+
+@celery_app.task(name="ingest_whatsapp_audio", bind=True, max_retries=3, default_retry_delay=5)
+def ingest_whatsapp_audio(self, sender_id: str, audio_id: str):
+    """
+    Acknowledges a WhatsApp voice note, downloads it and starts the presentation pipeline.
+    """
+    if self.request.retries == 0:
+        try:
+            # Reply "Processing..."
+            send_whatsapp_message(sender_id, "Processing your audio presentation...")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not send processing notice to {sender_id}: {e}")
+
+    # Download audio
+    audio_path = os.path.join(Config.UPLOAD_DIR, f"{audio_id}.ogg")
+    try:
+        if not download_media(audio_id, audio_path):
+            logger.error(f"❌ WhatsApp media {audio_id} has no download URL")
+            return {"status": "error", "error": "Media URL not found"}
+    except Exception as e:
+        logger.warning(f"⚠️ Media download for {audio_id} failed: {e}")
+        raise self.retry(exc=e)
+
+    meta = get_artifact_store().put_file(audio_path, os.path.basename(audio_path), KIND_UPLOAD)
+
+    # Trigger background task with WhatsApp recipient. The same voice note sent
+    # again (forwarded, re-sent) while its deck is being made joins that job;
+    # once it has been delivered, a new one delivers it again.
+    task, attached = submit_once(
+        f"audio:{meta['digest']}:whatsapp:{sender_id}", PROCESS_AUDIO, meta["name"],
+        whatsapp_to=sender_id, audio_sha256=meta["digest"], reuse_result=False,
+    )
+    if attached:
+        logger.info(f"♻️ WhatsApp audio {audio_id} is already being processed as {task.id}")
+        return {"status": "attached", "task_id": task.id}
+    return {"status": "queued", "task_id": task.id}
+
+@celery_app.task(name="send_whatsapp_text")
+def send_whatsapp_text(to: str, message: str):
+    return send_whatsapp_message(to, message)
@@ -0,0 +1,37 @@
+import threading
+from collections import defaultdict
+from utils.redis_client import get_redis
+
+# Counters live in one Redis hash so every worker and the API see the same numbers.
+# Without Redis they are only per-process.
+REDIS_KEY = "stats:counters"
+
+_local = defaultdict(int)
+_lock = threading.Lock()
+
+def incr(name: str, amount: int = 1):
+    """Increments a named counter."""
+    r = get_redis()
+    if r is not None:
+        try:
+            r.hincrby(REDIS_KEY, name, amount)
+            return
+        except Exception as e:
+            print(f"⚠️ Counter {name} not recorded in Redis: {e}")
+    with _lock:
+        _local[name] += amount
+
+def get_counters(prefix: str = "") -> dict:
+    """Returns all counters whose name starts with prefix."""
+    values = {}
+    r = get_redis()
+    if r is not None:
+        try:
+            for k, v in r.hgetall(REDIS_KEY).items():
+                values[k.decode()] = int(v)
+        except Exception as e:
+            print(f"⚠️ Could not read counters from Redis: {e}")
+    with _lock:
+        for k, v in _local.items():
+            values[k] = values.get(k, 0) + v
+    return {k: v for k, v in values.items() if k.startswith(prefix)}
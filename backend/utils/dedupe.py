@@ -0,0 +1,39 @@
+import threading
+import time
+from utils.redis_client import get_redis
+
+_seen = {}
+_lock = threading.Lock()
+
+def first_seen(key: str, ttl: int) -> bool:
+    """
+    Returns True the first time key is seen within ttl seconds, False for repeats.
+    Shared across processes through Redis; per-process when Redis is unavailable.
+    """
+    r = get_redis()
+    if r is not None:
+        try:
+            return bool(r.set(f"dedupe:{key}", 1, nx=True, ex=ttl))
+        except Exception as e:
+            print(f"⚠️ Dedupe check for {key} fell back to local state: {e}")
+
+    now = time.monotonic()
+    with _lock:
+        # Drop expired keys so the fallback map does not grow forever
+        for k in [k for k, expires in _seen.items() if expires <= now]:
+            del _seen[k]
+        if key in _seen:
+            return False
+        _seen[key] = now + ttl
+        return True
+
+def forget(key: str):
+    """Clears key so a later delivery is processed again (e.g. after a failed enqueue)."""
+    r = get_redis()
+    if r is not None:
+        try:
+            r.delete(f"dedupe:{key}")
+        except Exception as e:
+            print(f"⚠️ Could not clear dedupe key {key}: {e}")
+    with _lock:
+        _seen.pop(key, None)
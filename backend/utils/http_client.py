@@ -0,0 +1,31 @@
+import os
+import threading
+import httpx
+from config import Config
+
+# One pooled client per process. Celery prefork children must not reuse
+# sockets opened by the parent, so the client is keyed on the current PID.
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+def get_http_client() -> httpx.Client:
+    """
+    Returns the shared, connection-pooled HTTP client for this process (a new one
+    if it was closed).
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid or _client.is_closed:
+        with _lock:
+            if _client is None or _client_pid != pid or _client.is_closed:
+                _client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=Config.HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=Config.HTTP_MAX_CONNECTIONS,
+                    ),
+                    timeout=httpx.Timeout(Config.HTTP_TIMEOUT),
+                    follow_redirects=True,
+                )
+                _client_pid = pid
+    return _client
@@ -0,0 +1,81 @@
+import threading
+import time
+from utils.redis_client import get_redis
+
+# Maps a job key (audio hash, idempotency key...) to the task id handling it, so
+# repeat submissions from any API process or worker attach to that task. Values
+# are "task_id|claimed_at" (epoch seconds) so callers can tell a lost job apart
+# from one that was just queued.
+KEY_PREFIX = "inflight:"
+
+# Sets the key to ARGV[1] unless another task holds it; a holder whose task id is
+# ARGV[2] (a job the caller decided to replace) is overwritten. Returns the value.
+_CLAIM_LUA = """
+local current = redis.call('GET', KEYS[1])
+if (not current) or string.match(current, '^[^|]*') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    return ARGV[1]
+end
+return current
+"""
+
+# Deletes the key only while task ARGV[1] still holds it
+_RELEASE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current and string.match(current, '^[^|]*') == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts = {}
+_local = {}
+_lock = threading.Lock()
+
+def _run(r, source: str, key: str, args: list):
+    if source not in _scripts:
+        _scripts[source] = r.register_script(source)
+    return _scripts[source](keys=[f"{KEY_PREFIX}{key}"], args=args, client=r)
+
+def _parse(value: str):
+    task_id, _, claimed_at = value.partition("|")
+    try:
+        return task_id, float(claimed_at)
+    except ValueError:
+        return task_id, 0.0 # Written before claims were timestamped
+
+def claim(key: str, task_id: str, ttl: int, stale: str = None):
+    """
+    Registers task_id for key unless another task already holds it (the task id
+    stale, if given, is replaced). Returns (holder task id, claimed_at) afterwards.
+    """
+    claimed_at = time.time()
+    r = get_redis()
+    if r is not None:
+        try:
+            holder = _run(r, _CLAIM_LUA, key, [f"{task_id}|{claimed_at}", stale or "", int(ttl)])
+            return _parse(holder.decode() if isinstance(holder, bytes) else holder)
+        except Exception as e:
+            print(f"⚠️ In-flight registry for {key} fell back to local state: {e}")
+
+    now = time.monotonic()
+    with _lock:
+        for k in [k for k, (_, _, expires) in _local.items() if expires <= now]:
+            del _local[k]
+        current = _local.get(key)
+        if current is None or current[0] == stale:
+            _local[key] = (task_id, claimed_at, now + ttl)
+            return task_id, claimed_at
+        return current[0], current[1]
+
+def release(key: str, task_id: str):
+    """Drops key if task_id still holds it (e.g. when the task could not be enqueued)."""
+    r = get_redis()
+    if r is not None:
+        try:
+            _run(r, _RELEASE_LUA, key, [task_id])
+        except Exception as e:
+            print(f"⚠️ Could not release in-flight key {key}: {e}")
+    with _lock:
+        if _local.get(key, (None,))[0] == task_id:
+            del _local[key]
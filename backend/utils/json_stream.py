@@ -0,0 +1,66 @@
+import json
+
+class SlideStreamParser:
+    """
+    Incremental scanner for the presentation JSON as a model streams it.
+
+    feed() takes the next text chunk and returns the slides whose objects were
+    completed by it, so work on slide i can start before the response ends.
+    Markdown fences and anything outside the top-level object are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_key = None # Last string seen at depth 1 (the current top-level key)
+        self._slides_depth = None # Depth inside the "slides" array, once entered
+        self._slide_start = None
+        self.slides_seen = 0
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1:pos]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_key == "slides":
+                    self._slides_depth = self._depth
+                elif char == "{" and self._slides_depth is not None and self._depth == self._slides_depth + 1:
+                    self._slide_start = pos
+            elif char in "}]":
+                if char == "}" and self._slide_start is not None and self._depth == self._slides_depth + 1:
+                    try:
+                        completed.append(json.loads(buffer[self._slide_start:pos + 1]))
+                        self.slides_seen += 1
+                    except json.JSONDecodeError:
+                        pass # The full response is parsed (and repaired) at the end anyway
+                    self._slide_start = None
+                elif char == "]" and self._depth == self._slides_depth:
+                    self._slides_depth = None
+                self._depth -= 1
+        self._pos = len(buffer)
+        return completed
+
+    @property
+    def text(self) -> str:
+        return self._buffer
@@ -0,0 +1,187 @@
+import contextlib
+import contextvars
+import glob
+import os
+import time
+from utils.counters import get_counters
+
+# Safe import for Prometheus; without it spans are still recorded on the job
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, start_http_server,
+    )
+    from prometheus_client.core import CounterMetricFamily
+    from prometheus_client import multiprocess
+    HAS_PROMETHEUS = True
+except ImportError:
+    print("Warning: prometheus_client not installed; /metrics and the worker exporter are disabled.")
+    HAS_PROMETHEUS = False
+
+# Stage names, in pipeline order
+STAGE_UPLOAD = "upload"
+STAGE_GEMINI_UPLOAD = "gemini_upload_wait"
+STAGE_MODEL_CALL = "model_call"
+STAGE_IMAGE_FETCH = "image_fetch"
+STAGE_PPTX_BUILD = "pptx_build"
+STAGE_PDF_CONVERT = "pdf_convert"
+STAGE_WHATSAPP_SEND = "whatsapp_send"
+
+# From a cached image (ms) to a long Plus AI generation or PDF conversion (minutes)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# With prefork workers every child writes its samples here and the exporter merges them
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+if HAS_PROMETHEUS:
+    STAGE_SECONDS = Histogram(
+        "presentation_stage_seconds",
+        "Time spent in each pipeline stage.",
+        ["stage", "outcome"],
+        buckets=STAGE_BUCKETS,
+    )
+
+    GRAPH_SECONDS = Histogram(
+        "whatsapp_graph_request_seconds",
+        "WhatsApp Graph API calls per endpoint, retries and backoff included.",
+        ["endpoint", "outcome"],
+        buckets=STAGE_BUCKETS,
+    )
+
+    GRAPH_RETRIES = Counter(
+        "whatsapp_graph_retries",
+        "WhatsApp Graph API retries (429, 5xx, connection errors) per endpoint.",
+        ["endpoint"],
+    )
+
+    STARTUP_SECONDS = Gauge(
+        "presentation_startup_seconds",
+        "Cold start of this process: imports, and process start until ready.",
+        ["component", "phase"],
+        multiprocess_mode="max",
+    )
+
+    class SharedCountersCollector:
+        """Exposes the shared counters (utils.counters) as presentation_events_total{event=...}."""
+
+        def collect(self):
+            family = CounterMetricFamily(
+                "presentation_events", "Pipeline events shared by every worker (fallbacks, 429s, cache hits...).",
+                labels=["event"],
+            )
+            for name, value in sorted(get_counters().items()):
+                family.add_metric([name], value)
+            yield family
+
+# Spans of the job the current task (or coroutine, or to_thread call) is working on
+_current_spans = contextvars.ContextVar("presentation_spans", default=None)
+
+@contextlib.contextmanager
+def collect_spans(spans: list):
+    """Appends every span recorded inside the block to spans (e.g. a job payload's list)."""
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+
+def observe(stage: str, seconds: float, ok: bool = True, **attrs):
+    """Records one finished span: the stage histogram, plus the current job's span list."""
+    if HAS_PROMETHEUS:
+        STAGE_SECONDS.labels(stage=stage, outcome="ok" if ok else "error").observe(seconds)
+    spans = _current_spans.get()
+    if spans is not None:
+        spans.append({"stage": stage, "seconds": round(seconds, 4), "ok": ok, **attrs})
+
+def observe_graph_call(endpoint: str, seconds: float, ok: bool, retries: int):
+    """Records one Graph API call (all its attempts) under its endpoint."""
+    if HAS_PROMETHEUS:
+        GRAPH_SECONDS.labels(endpoint=endpoint, outcome="ok" if ok else "error").observe(seconds)
+        if retries:
+            GRAPH_RETRIES.labels(endpoint=endpoint).inc(retries)
+
+@contextlib.contextmanager
+def span(stage: str, **attrs):
+    """Times the block as one span of stage; an exception marks it as failed."""
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(stage, time.monotonic() - started, ok, **attrs)
+
+def process_age() -> float:
+    """Seconds since this process was created (from /proc on Linux), or None if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22 overall
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def record_startup(component: str, import_seconds: float) -> dict:
+    """Records how long component took to import its modules and to become ready."""
+    ready_seconds = process_age()
+    startup = {"component": component, "import_seconds": round(import_seconds, 3)}
+    if ready_seconds is not None:
+        startup["ready_seconds"] = round(ready_seconds, 3)
+    if HAS_PROMETHEUS:
+        STARTUP_SECONDS.labels(component=component, phase="import").set(import_seconds)
+        if ready_seconds is not None:
+            STARTUP_SECONDS.labels(component=component, phase="ready").set(ready_seconds)
+    print(f"🚀 {component} started: {startup}")
+    return startup
+
+def summarize_spans(spans: list) -> dict:
+    """Total seconds and count per stage, for logs and the job result."""
+    summary = {}
+    for item in spans:
+        entry = summary.setdefault(item["stage"], {"seconds": 0.0, "count": 0})
+        entry["seconds"] = round(entry["seconds"] + item["seconds"], 4)
+        entry["count"] += 1
+    return summary
+
+_registry = None
+
+def _get_registry():
+    """The default registry, or with PROMETHEUS_MULTIPROC_DIR one that merges every process's files at scrape time."""
+    global _registry
+    if _registry is None:
+        if MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        registry.register(SharedCountersCollector())
+        _registry = registry
+    return _registry
+
+def metrics_payload():
+    """(body, content_type) for a /metrics response, or (None, None) without prometheus_client."""
+    if not HAS_PROMETHEUS:
+        return None, None
+    return generate_latest(_get_registry()), CONTENT_TYPE_LATEST
+
+def start_worker_exporter(port: int):
+    """
+    Serves /metrics for a Celery worker on port. With PROMETHEUS_MULTIPROC_DIR
+    set (prefork pools) the samples of every child process are merged.
+    """
+    if not HAS_PROMETHEUS or not port:
+        return
+    if MULTIPROC_DIR:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        # Files left by a previous run of this worker would be counted again
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.db")):
+            os.remove(path)
+    try:
+        start_http_server(port, registry=_get_registry())
+        print(f"📈 Worker metrics on :{port}/metrics")
+    except OSError as e:
+        print(f"⚠️ Worker metrics exporter not started: {e}")
+
+def mark_process_dead(pid: int):
+    """Drops a finished prefork child's live gauges from the multiprocess files."""
+    if HAS_PROMETHEUS and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+from config import Config
+from utils.redis_client import get_redis
+
+CHANNEL_PREFIX = "task-progress:"
+
+def publish_progress(task_id: str, event: dict):
+    """
+    Publishes a task state change ({task_id, status, result, info}) to its Redis channel.
+    Best effort: clients fall back to polling /task/{task_id}.
+    """
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.publish(f"{CHANNEL_PREFIX}{task_id}", json.dumps(event, default=str))
+    except Exception as e:
+        print(f"⚠️ Could not publish progress for {task_id}: {e}")
+
+class ProgressHub:
+    """
+    Fans task progress out to streaming clients in this API process.
+
+    One pattern subscription to Redis serves every connected client; each
+    client gets an asyncio.Queue for the task it follows.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._listener = None
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+        while True:
+            client = aioredis.from_url(Config.REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    task_id = message["channel"].decode()[len(CHANNEL_PREFIX):]
+                    event = json.loads(message["data"])
+                    for queue in list(self._subscribers.get(task_id, ())):
+                        queue.put_nowait(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Progress listener lost Redis ({e}), reconnecting...")
+                await asyncio.sleep(2)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(task_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[task_id]
+
+progress_hub = ProgressHub()
@@ -0,0 +1,46 @@
+import os
+import time
+import threading
+from config import Config
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    print("Warning: redis not installed; shared caches fall back to local state.")
+    HAS_REDIS = False
+
+# Retry a failed connection at most this often instead of on every call
+_RETRY_AFTER = 30
+
+_client = None
+_client_pid = None
+_failed_at = 0.0
+_lock = threading.Lock()
+
+def get_redis():
+    """
+    Returns a shared Redis client for this process, or None if Redis is unavailable.
+    """
+    global _client, _client_pid, _failed_at
+    if not HAS_REDIS or not Config.REDIS_URL:
+        return None
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    if _failed_at and time.monotonic() - _failed_at < _RETRY_AFTER:
+        return None
+
+    with _lock:
+        if _client is not None and _client_pid == pid:
+            return _client
+        try:
+            client = redis.Redis.from_url(Config.REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+            client.ping()
+            _client, _client_pid = client, pid
+            return _client
+        except Exception as e:
+            print(f"⚠️ Redis unavailable ({e}); using local fallback")
+            _failed_at = time.monotonic()
+            return None
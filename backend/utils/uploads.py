@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+from config import Config
+
+CHUNK_SIZE = 1024 * 1024
+
+# Members of an uploaded zip that are treated as voice notes
+AUDIO_EXTENSIONS = {".webm", ".ogg", ".opus", ".mp3", ".wav", ".m4a", ".mp4", ".aac", ".flac"}
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, expected: int):
+        super().__init__(f"Expected chunk at offset {expected}")
+        self.expected = expected
+
+def new_upload_path(filename: str) -> str:
+    """Returns a fresh path in UPLOAD_DIR that keeps the original extension."""
+    extension = os.path.splitext(filename or "")[1]
+    if not extension:
+        extension = ".webm" # Default to webm if no extension
+    return os.path.join(Config.UPLOAD_DIR, f"{uuid.uuid4()}{extension}")
+
+def _make_shared(file_path: str):
+    # FIX PERMISSIONS for Docker volumes
+    try:
+        os.chmod(file_path, 0o666) # Read/Write for everyone
+    except Exception as perm_err:
+        print(f"Could not change permissions for {file_path}: {perm_err}")
+
+async def iter_upload_file(upload_file, chunk_size: int = CHUNK_SIZE):
+    """Yields an UploadFile's content in chunks without blocking the event loop."""
+    while True:
+        chunk = await upload_file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+async def save_stream(chunks, file_path: str, max_bytes: int, mode: str = "wb", start_size: int = 0, digest=None):
+    """
+    Writes an async stream of chunks to file_path off the event loop, enforcing max_bytes
+    and hashing the bytes as they arrive. Returns (total_size, digest).
+    """
+    digest = digest or hashlib.sha256()
+    size = start_size
+    f = await asyncio.to_thread(open, file_path, mode)
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        if mode == "wb":
+            await asyncio.to_thread(_remove_quietly, file_path)
+        raise
+    await asyncio.to_thread(f.close)
+    return size, digest
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware capping request bodies on the multipart upload routes.
+    Starlette spools a whole multipart form to disk before the endpoint runs,
+    so the limit is enforced here: on Content-Length up front, and on a
+    running count for bodies sent without one. limits maps exact paths to bytes.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b"-1"))
+        except ValueError:
+            declared = -1
+        if declared > limit:
+            return await _reject_too_large(send, limit)
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def counted_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    too_large = True
+                    raise UploadTooLarge(f"Upload exceeds the {limit} byte limit")
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Form parsing turns the error into its own 400; the 413 below replaces it
+            if too_large:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counted_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not response_started:
+            await _reject_too_large(send, limit)
+
+async def _reject_too_large(send, limit: int):
+    body = json.dumps({"detail": f"Upload exceeds the {limit} byte limit"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def save_upload_file(upload_file, max_bytes: int):
+    """Streams a multipart UploadFile to UPLOAD_DIR. Returns (file_path, sha256 hex)."""
+    file_path = new_upload_path(upload_file.filename)
+    _, digest = await save_stream(iter_upload_file(upload_file), file_path, max_bytes)
+    await asyncio.to_thread(_make_shared, file_path)
+    return file_path, digest.hexdigest()
+
+# --- Resumable chunked uploads ---
+# Each session is a '<id>.part' data file plus a '<id>.json' metadata file in
+# UPLOAD_DIR/partial. The offset a client must resume from is the part file size.
+
+def _partial_dir() -> str:
+    path = os.path.join(Config.UPLOAD_DIR, "partial")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _session_id(upload_id: str) -> str:
+    return str(uuid.UUID(upload_id)) # Rejects anything that is not a plain UUID
+
+def _session_paths(upload_id: str):
+    upload_id = _session_id(upload_id)
+    base = os.path.join(_partial_dir(), upload_id)
+    return f"{base}.part", f"{base}.json"
+
+def create_chunked_upload(filename: str, total_size: int) -> str:
+    if total_size <= 0:
+        raise ValueError("total_size must be a positive number of bytes")
+    if total_size > Config.MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds the {Config.MAX_UPLOAD_BYTES} byte limit")
+    upload_id = str(uuid.uuid4())
+    part_path, meta_path = _session_paths(upload_id)
+    with open(meta_path, "w") as f:
+        json.dump({"filename": filename, "total_size": total_size}, f)
+    open(part_path, "wb").close()
+    return upload_id
+
+def _read_meta(upload_id: str) -> dict:
+    _, meta_path = _session_paths(upload_id)
+    with open(meta_path) as f:
+        return json.load(f)
+
+def chunked_upload_offset(upload_id: str) -> int:
+    """Bytes received so far. Raises FileNotFoundError for unknown sessions."""
+    part_path, _ = _session_paths(upload_id)
+    return os.path.getsize(part_path)
+
+_session_locks = {}
+
+async def append_chunk(upload_id: str, offset: int, chunks) -> int:
+    """Appends a chunk at offset (which must equal the bytes received so far). Returns the new offset."""
+    upload_id = _session_id(upload_id) # Validate before a lock is kept for it
+    part_path, _ = _session_paths(upload_id)
+    lock = _session_locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        meta = await asyncio.to_thread(_read_meta, upload_id)
+        current = await asyncio.to_thread(chunked_upload_offset, upload_id)
+        if offset != current:
+            raise UploadOffsetMismatch(current)
+        max_bytes = min(meta["total_size"], Config.MAX_UPLOAD_BYTES)
+        size, _ = await save_stream(chunks, part_path, max_bytes, mode="ab", start_size=current)
+        return size
+
+def complete_chunked_upload(upload_id: str):
+    """
+    Moves a fully received session into UPLOAD_DIR. Returns (file_path, sha256 hex).
+    Blocking: call it from a thread.
+    """
+    meta = _read_meta(upload_id)
+    part_path, meta_path = _session_paths(upload_id)
+    received = os.path.getsize(part_path)
+    if received != meta["total_size"]:
+        raise UploadOffsetMismatch(received)
+
+    digest = hashlib.sha256()
+    with open(part_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    file_path = new_upload_path(meta["filename"])
+    os.replace(part_path, file_path) # Same volume, so no copy
+    os.remove(meta_path)
+    _session_locks.pop(_session_id(upload_id), None)
+    _make_shared(file_path)
+    return file_path, digest.hexdigest()
+
+def abort_chunked_upload(upload_id: str):
+    """Deletes a session and what it received. Raises FileNotFoundError for unknown sessions."""
+    part_path, meta_path = _session_paths(upload_id)
+    os.remove(meta_path)
+    _remove_quietly(part_path)
+    _session_locks.pop(_session_id(upload_id), None)
+
+def prune_session_locks() -> int:
+    """Drops the locks of sessions that no longer exist (e.g. swept by the janitor). Returns how many."""
+    stale = []
+    for upload_id, lock in list(_session_locks.items()):
+        try:
+            meta_path = _session_paths(upload_id)[1]
+        except ValueError:
+            stale.append(upload_id) # Not a session id; nothing should hold it
+            continue
+        if not lock.locked() and not os.path.exists(meta_path):
+            stale.append(upload_id)
+    for upload_id in stale:
+        _session_locks.pop(upload_id, None)
+    return len(stale)
+
+# --- Batch uploads ---
+
+def extract_audio_zip(zip_path: str, max_files: int, max_bytes: int) -> list:
+    """
+    Saves every audio member of a zip archive into UPLOAD_DIR. Returns
+    [(file_path, sha256 hex, original name)]. Blocking: call it from a thread.
+    Raises UploadTooLarge past max_files members or max_bytes per member, and
+    zipfile.BadZipFile for archives that cannot be read.
+    """
+    saved = []
+    file_path = None
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+                    continue
+                if len(saved) >= max_files:
+                    raise UploadTooLarge(f"Batch exceeds the {max_files} file limit")
+
+                # file_size comes from the archive header, so the stream is checked too
+                if info.file_size > max_bytes:
+                    raise UploadTooLarge(f"{name} exceeds the {max_bytes} byte limit")
+                file_path = new_upload_path(name)
+                digest = hashlib.sha256()
+                size = 0
+                with archive.open(info) as src, open(file_path, "wb") as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise UploadTooLarge(f"{name} exceeds the {max_bytes} byte limit")
+                        digest.update(chunk)
+                        dst.write(chunk)
+                _make_shared(file_path)
+                saved.append((file_path, digest.hexdigest(), name))
+                file_path = None
+    except BaseException:
+        for path in [p for p, _, _ in saved] + [file_path]:
+            if path:
+                _remove_quietly(path)
+        raise
+    return saved
@@ -1,62 +1,105 @@
-import requests
-from config import Config
+import mimetypes
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from config import Config
+from utils.http_client import get_http_client
+from utils.counters import incr
+from utils.metrics import observe_graph_call
+
+GRAPH_BASE_URL = "https://graph.facebook.com/v18.0"
+
+# Graph API answers worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+def _auth_headers() -> dict:
+    return {"Authorization": f"Bearer {Config.WHATSAPP_API_TOKEN}"}
+
+def graph_request(method: str, url: str, endpoint: str, open_files=None, **kwargs):
+    """
+    Sends a Graph API request over the shared keep-alive client, retrying 429/5xx and
+    connection errors with exponential backoff (honouring Retry-After).
+
+    open_files, if given, is called before every attempt to build fresh `files=`
+    streams, so multipart bodies are re-read from disk on retry.
+    """
+    client = get_http_client()
+    headers = {**_auth_headers(), **kwargs.pop("headers", {})}
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        files = open_files() if open_files else None
+        try:
+            response = client.request(method, url, headers=headers, files=files, **kwargs)
+            error = None
+        except Exception as e:
+            response, error = None, e
+        finally:
+            for _, spec in (files or {}).items():
+                spec[1].close()
+
+        retryable = error is not None or response.status_code in RETRY_STATUSES
+        if response is not None and response.status_code == 429:
+            incr("graph.rate_limited")
+        if not retryable or attempt >= Config.GRAPH_MAX_RETRIES:
+            ok = error is None and response.status_code < 400
+            observe_graph_call(endpoint, time.monotonic() - started, ok, attempt)
+            if error is not None:
+                raise error
+            return response
+
+        delay = Config.GRAPH_RETRY_BACKOFF * (2 ** attempt)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        print(f"⚠️ Graph {endpoint} {'error: ' + str(error) if error else response.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+        attempt += 1
 
 def send_whatsapp_message(to: str, message: str):
     """
     Sends a text message via WhatsApp Cloud API.
     """
-    url = f"https://graph.facebook.com/v18.0/{Config.WHATSAPP_PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {Config.WHATSAPP_API_TOKEN}",
-        "Content-Type": "application/json"
-    }
     data = {
         "messaging_product": "whatsapp",
         "to": to,
         "type": "text",
         "text": {"body": message}
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = graph_request(
+        "POST", f"{GRAPH_BASE_URL}/{Config.WHATSAPP_PHONE_NUMBER_ID}/messages", "messages", json=data
+    )
     return response.json()
 
-def send_whatsapp_document(to: str, file_path: str, filename: str):
+def upload_whatsapp_media(source, filename: str):
     """
-    Sends a document via WhatsApp Cloud API.
+    Uploads a file to the WhatsApp media endpoint. source is a path (streamed from
+    disk) or the file's bytes. Returns the media ID or None.
     """
-    # First, upload the media to get a media ID (simplified for now, assumes direct media upload or link)
-    # WhatsApp Cloud API usually requires uploading media first to get an ID for large files,
-    # or sending a link. For this implementation, we'll try to use the media upload endpoint.
-    
-    url = f"https://graph.facebook.com/v18.0/{Config.WHATSAPP_PHONE_NUMBER_ID}/media"
-    headers = {
-        "Authorization": f"Bearer {Config.WHATSAPP_API_TOKEN}"
-    }
-    
-    files = {
-        'file': (filename, open(file_path, 'rb'), 'application/vnd.openxmlformats-officedocument.presentationml.presentation')
-    }
-    
-    data = {
-        'messaging_product': 'whatsapp'
-    }
-    
-    # Step 1: Upload Media
-    upload_response = requests.post(url, headers=headers, files=files, data=data)
-    upload_result = upload_response.json()
-    
+    mime_type = mimetypes.guess_type(filename)[0] or PPTX_MIME
+
+    def open_files():
+        stream = BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+        return {'file': (filename, stream, mime_type)}
+
+    response = graph_request(
+        "POST",
+        f"{GRAPH_BASE_URL}/{Config.WHATSAPP_PHONE_NUMBER_ID}/media",
+        "media_upload",
+        open_files=open_files,
+        data={'messaging_product': 'whatsapp'},
+    )
+    upload_result = response.json()
+
     if 'id' not in upload_result:
         print(f"Failed to upload media: {upload_result}")
-        return
-        
-    media_id = upload_result['id']
-    
-    # Step 2: Send Message with Media ID
-    msg_url = f"https://graph.facebook.com/v18.0/{Config.WHATSAPP_PHONE_NUMBER_ID}/messages"
-    msg_headers = {
-        "Authorization": f"Bearer {Config.WHATSAPP_API_TOKEN}",
-        "Content-Type": "application/json"
-    }
+        return None
+    return upload_result['id']
+
+def _send_document_message(to: str, media_id: str, filename: str):
     msg_data = {
         "messaging_product": "whatsapp",
         "to": to,
@@ -67,23 +110,50 @@ def send_whatsapp_document(to: str, file_path: str, filename: str):
             "caption": "Here is your generated presentation!"
         }
     }
-    
-    requests.post(msg_url, headers=msg_headers, json=msg_data)
+    graph_request("POST", f"{GRAPH_BASE_URL}/{Config.WHATSAPP_PHONE_NUMBER_ID}/messages", "messages", json=msg_data)
+
+def send_whatsapp_documents(to: str, documents: list):
+    """
+    Sends several documents, given as (file path or bytes, filename) pairs. Uploads run
+    concurrently; the messages are then sent in the given order.
+    """
+    if not documents:
+        return
+    with ThreadPoolExecutor(max_workers=len(documents), thread_name_prefix="wa-upload") as pool:
+        media_ids = list(pool.map(lambda doc: upload_whatsapp_media(*doc), documents))
+
+    for (_, filename), media_id in zip(documents, media_ids):
+        if media_id:
+            _send_document_message(to, media_id, filename)
+
+def send_whatsapp_document(to: str, file_path: str, filename: str):
+    """
+    Sends a document via WhatsApp Cloud API.
+    """
+    send_whatsapp_documents(to, [(file_path, filename)])
 
 def download_media(media_id: str, output_path: str):
     """
-    Downloads media from WhatsApp.
+    Downloads media from WhatsApp, streaming it to output_path.
     """
     # Get media URL
-    url = f"https://graph.facebook.com/v18.0/{media_id}"
-    headers = {
-        "Authorization": f"Bearer {Config.WHATSAPP_API_TOKEN}"
-    }
-    response = requests.get(url, headers=headers)
+    response = graph_request("GET", f"{GRAPH_BASE_URL}/{media_id}", "media_info")
     media_url = response.json().get('url')
-    
+
     if media_url:
         # Download content
-        media_content = requests.get(media_url, headers=headers)
-        with open(output_path, 'wb') as f:
-            f.write(media_content.content)
+        started = time.monotonic()
+        tmp_path = f"{output_path}.part"
+        ok = False
+        try:
+            with get_http_client().stream("GET", media_url, headers=_auth_headers()) as media_response:
+                media_response.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in media_response.iter_bytes(chunk_size=64 * 1024):
+                        f.write(chunk)
+            os.replace(tmp_path, output_path)
+            ok = True
+        finally:
+            observe_graph_call("media_download", time.monotonic() - started, ok, 0)
+        return output_path
+    return None
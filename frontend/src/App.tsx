@@ -5,6 +5,7 @@ import { Button } from './components/ui/button';
 import AudioRecorder from './components/AudioRecorder';
 import FileUpload from './components/FileUpload';
 import { Download, Loader2, Clock } from 'lucide-react';
+import { uploadAudio } from './lib/upload';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
@@ -50,15 +51,10 @@ function App() {
     setProgress(0);
     setSecondsElapsed(0);
 
-    const formData = new FormData();
     const filename = file instanceof File ? file.name : 'recording.webm';
-    formData.append('file', file, filename);
 
     try {
-      const response = await axios.post(`${API_URL}/upload-audio/`, formData, {
-        headers: { 'Content-Type': 'multipart/form-data' },
-      });
-      setTaskId(response.data.task_id);
+      setTaskId(await uploadAudio(API_URL, file, filename));
       setStatus('processing');
     } catch (error) {
       console.error(error);
@@ -78,53 +74,78 @@ function App() {
     return () => clearInterval(timer);
   }, [status]);
 
-  // Polling Effect
+  // Progress Effect: push updates over Server-Sent Events, polling /task as a fallback
   useEffect(() => {
-    let intervalId: ReturnType<typeof setInterval>;
+    let intervalId: ReturnType<typeof setInterval> | undefined;
+    let eventSource: EventSource | undefined;
+    let finished = false;
 
-    if (status === 'processing' && taskId) {
+    if (status !== 'processing' || !taskId) return;
+
+    const stop = () => {
+      finished = true;
+      if (eventSource) eventSource.close();
+      if (intervalId) clearInterval(intervalId);
+    };
+
+    // eslint-disable-next-line @typescript-eslint/no-explicit-any
+    const handleUpdate = (data: any) => {
+      const { status: taskStatus, result, info } = data;
+
+      if (taskStatus === 'PROGRESS' && info) {
+         if (info.status) setStatusMessage(info.status);
+         if (info.progress) setProgress(info.progress);
+         // Only update interpretation if provided and truthy
+         if (info.interpretation) {
+            setInterpretation(info.interpretation);
+         }
+      }
+      else if (taskStatus === 'SUCCESS') {
+        if (result.status === 'success') {
+          setStatus('completed');
+          setDownloadFilename(result.filename);
+          if (result.pdf_filename) setPdfFilename(result.pdf_filename);
+          // Ensure we keep the interpretation
+          if (result.interpretation) {
+             setInterpretation(result.interpretation);
+          }
+          setProgress(100);
+        } else {
+          setStatus('error');
+          setErrorMsg(result.error || 'Processing failed.');
+        }
+        stop();
+      } else if (taskStatus === 'FAILURE') {
+        setStatus('error');
+        setErrorMsg('Task failed unexpectedly.');
+        stop();
+      }
+    };
+
+    const startPolling = () => {
       intervalId = setInterval(async () => {
         try {
           const response = await axios.get(`${API_URL}/task/${taskId}`);
-          const { status: taskStatus, result, info } = response.data;
-
-          if (taskStatus === 'PROGRESS' && info) {
-             if (info.status) setStatusMessage(info.status);
-             if (info.progress) setProgress(info.progress);
-             // Only update interpretation if provided and truthy
-             if (info.interpretation) {
-                setInterpretation(info.interpretation);
-             }
-          }
-          else if (taskStatus === 'SUCCESS') {
-            if (result.status === 'success') {
-              setStatus('completed');
-              setDownloadFilename(result.filename);
-              if (result.pdf_filename) setPdfFilename(result.pdf_filename);
-              // Ensure we keep the interpretation
-              if (result.interpretation) {
-                 setInterpretation(result.interpretation);
-              }
-              setProgress(100);
-            } else {
-              setStatus('error');
-              setErrorMsg(result.error || 'Processing failed.');
-            }
-            clearInterval(intervalId);
-          } else if (taskStatus === 'FAILURE') {
-            setStatus('error');
-            setErrorMsg('Task failed unexpectedly.');
-            clearInterval(intervalId);
-          }
+          handleUpdate(response.data);
         } catch (error) {
           console.error(error);
         }
       }, 2000);
+    };
+
+    if (typeof EventSource !== 'undefined') {
+      eventSource = new EventSource(`${API_URL}/task/${taskId}/events`);
+      eventSource.onmessage = (event) => handleUpdate(JSON.parse(event.data));
+      eventSource.onerror = () => {
+        // Stream unavailable or dropped: fall back to polling
+        eventSource?.close();
+        if (!finished && !intervalId) startPolling();
+      };
+    } else {
+      startPolling();
     }
 
-    return () => {
-      if (intervalId) clearInterval(intervalId);
-    };
+    return stop;
   }, [status, taskId]);
 
   const handleDownload = () => {
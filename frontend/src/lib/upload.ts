@@ -0,0 +1,65 @@
+import axios from 'axios';
+
+// Recordings above this size use the resumable chunked endpoint
+const CHUNKED_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+const MAX_CHUNK_RETRIES = 5;
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function uploadInChunks(apiUrl: string, file: Blob, filename: string): Promise<string> {
+  const start = await axios.post(`${apiUrl}/upload-audio/chunked`, {
+    filename,
+    total_size: file.size,
+  });
+  const uploadId: string = start.data.upload_id;
+  const chunkSize: number = start.data.chunk_size;
+
+  let offset = 0;
+  let failures = 0;
+  let resync = false;
+  while (resync || offset < file.size) {
+    try {
+      if (resync) {
+        // Ask the server where to resume; the failed chunk may have partly landed.
+        // This query is retried like a chunk while the connection is down.
+        const status = await axios.get(`${apiUrl}/upload-audio/chunked/${uploadId}`);
+        offset = status.data.offset;
+        resync = false;
+        continue;
+      }
+      const chunk = file.slice(offset, offset + chunkSize);
+      const response = await axios.put(
+        `${apiUrl}/upload-audio/chunked/${uploadId}?offset=${offset}`,
+        chunk,
+        { headers: { 'Content-Type': 'application/octet-stream' } },
+      );
+      offset = response.data.offset;
+      failures = 0;
+    } catch (error) {
+      failures += 1;
+      if (failures > MAX_CHUNK_RETRIES) throw error;
+      await sleep(1000 * 2 ** failures);
+      resync = true;
+    }
+  }
+
+  const done = await axios.post(`${apiUrl}/upload-audio/chunked/${uploadId}/complete`);
+  return done.data.task_id;
+}
+
+/**
+ * Uploads audio and returns the processing task id. Large files and recordings
+ * go through the resumable chunked endpoint; small files use a single request.
+ */
+export async function uploadAudio(apiUrl: string, file: Blob, filename: string): Promise<string> {
+  if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+    return uploadInChunks(apiUrl, file, filename);
+  }
+
+  const formData = new FormData();
+  formData.append('file', file, filename);
+  const response = await axios.post(`${apiUrl}/upload-audio/`, formData, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+  return response.data.task_id;
+}